@@ -0,0 +1,561 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, unquote_plus, urlsplit
+
+import requests
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+UPSTREAMS = {
+    "wb": "https://api.worldbank.org/v2",
+    "ods": "https://public.opendatasoft.com/api/records/1.0/search/",
+    "overpass": "https://overpass-api.de/api",
+}
+MOCK_COUNTRIES = (
+    ("MX", "MEX", "Mexico"),
+    ("US", "USA", "United States"),
+    ("ES", "ESP", "Spain"),
+    ("AR", "ARG", "Argentina"),
+    ("CO", "COL", "Colombia"),
+    ("CL", "CHL", "Chile"),
+    ("BR", "BRA", "Brazil"),
+    ("PE", "PER", "Peru"),
+)
+MOCK_POIS = 400
+MOCK_TAGS = (("place", "suburb"), ("amenity", "restaurant"), ("shop", "mall"), ("amenity", "cafe"), ("office", "company"))
+
+
+def stable_value(*parts: Any) -> float:
+    digest = hashlib.sha256(repr(parts).encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") / 2**32
+
+
+def encode_payload(status: int, payload: Any) -> Tuple[int, str, bytes]:
+    if isinstance(payload, str):
+        return status, "text/plain", payload.encode("utf-8")
+    return status, "application/json", json.dumps(payload).encode("utf-8")
+
+
+class MockUpstream:
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        error_rate: float = 0.0,
+        cities_per_country: int = 1500,
+        fixtures: Optional[str] = None,
+        record: bool = False,
+        seed: int = 7,
+    ) -> None:
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.cities_per_country = cities_per_country
+        self.fixtures = fixtures
+        self.record = record
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+        self.errors = 0
+        self.last_request = 0.0
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def base(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def env(self) -> Dict[str, str]:
+        return {
+            "RADAR_WB_BASE": f"{self.base}/wb",
+            "RADAR_ODS_BASE": f"{self.base}/ods/",
+            "RADAR_OVERPASS_URL": f"{self.base}/overpass/interpreter",
+            "RADAR_OVERPASS_URLS": f"{self.base}/overpass/interpreter",
+        }
+
+    def start(self) -> "MockUpstream":
+        threading.Thread(target=self._server.serve_forever, name="mock-upstream", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts = {}
+            self.errors = 0
+
+    def snapshot(self) -> Tuple[Dict[str, int], int]:
+        with self._lock:
+            return dict(self.counts), self.errors
+
+    def wait_idle(self, quiet: float = 0.5, timeout: float = 60.0) -> None:
+        # Background page loads and refreshes keep going after a render returns;
+        # wait for them so every scenario is charged for its own requests only.
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._lock:
+                idle = time.time() - self.last_request
+            if idle >= quiet:
+                return
+            time.sleep(quiet / 4)
+
+    def respond(self, method: str, path: str, query: str, body: bytes) -> Tuple[int, str, bytes]:
+        upstream, _, rest = path.lstrip("/").partition("/")
+        with self._lock:
+            self.counts[upstream] = self.counts.get(upstream, 0) + 1
+            self.last_request = time.time()
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000 * (0.5 + self._random.random()))
+        if failed:
+            return encode_payload(503, {"error": "injected"})
+        if upstream == "overpass" and rest == "status":
+            return encode_payload(200, self.overpass_status())
+        if self.fixtures:
+            key = hashlib.sha256(f"{method} {path}?{query}\n".encode("utf-8") + body).hexdigest()
+            fixture_path = os.path.join(self.fixtures, f"{key}.json")
+            if os.path.exists(fixture_path):
+                with open(fixture_path, encoding="utf-8") as handle:
+                    fixture = json.load(handle)
+                return 200, fixture["content_type"], fixture["body"].encode("utf-8", "surrogateescape")
+            if self.record:
+                status, content_type, data = self.forward(method, upstream, rest, query, body)
+                if status == 200:
+                    os.makedirs(self.fixtures, exist_ok=True)
+                    with open(fixture_path, "w", encoding="utf-8") as handle:
+                        # Raw body plus content type, so CSV and text answers replay verbatim.
+                        json.dump(
+                            {"content_type": content_type, "body": data.decode("utf-8", "surrogateescape")}, handle
+                        )
+                return status, content_type, data
+        params = parse_qs(query)
+        if upstream == "wb":
+            return encode_payload(200, self.world_bank(rest, params))
+        if upstream == "ods":
+            return encode_payload(200, self.opendatasoft(params))
+        if upstream == "overpass":
+            return encode_payload(200, self.overpass(unquote_plus(body.decode("utf-8")).partition("=")[2]))
+        return encode_payload(404, {"error": "unknown upstream"})
+
+    def forward(self, method: str, upstream: str, rest: str, query: str, body: bytes) -> Tuple[int, str, bytes]:
+        url = UPSTREAMS[upstream].rstrip("/") + (f"/{rest}" if rest else "")
+        response = requests.request(
+            method,
+            f"{url}?{query}" if query else url,
+            data=body or None,
+            headers={"Content-Type": "application/x-www-form-urlencoded"} if body else None,
+            timeout=180,
+        )
+        return response.status_code, response.headers.get("Content-Type", "application/octet-stream"), response.content
+
+    def world_bank(self, rest: str, params: Dict[str, List[str]]) -> Any:
+        parts = rest.strip("/").split("/")
+        if parts == ["country"]:
+            rows = [
+                {"id": iso3, "iso2Code": iso2, "name": name, "region": {"id": "LCN"}}
+                for iso2, iso3, name in MOCK_COUNTRIES
+            ]
+            rows.append({"id": "WLD", "iso2Code": "1W", "name": "World", "region": {"id": "NA"}})
+            return [{"page": 1, "pages": 1, "total": len(rows)}, rows]
+        codes = unquote(parts[1]).split(";")
+        if codes == ["all"]:
+            codes = [iso3 for _, iso3, _ in MOCK_COUNTRIES]
+        indicators = unquote(parts[3]).split(";")
+        if "mrnev" in params:
+            years = 1
+        elif "date" in params:
+            start, _, end = params["date"][0].partition(":")
+            years = int(end) - int(start) + 1
+        else:
+            years = int(params.get("per_page", ["10"])[0])
+        rows = []
+        for code in codes:
+            for indicator in indicators:
+                for offset in range(years):
+                    rows.append(
+                        {
+                            "indicator": {"id": indicator},
+                            "country": {"id": code.upper()},
+                            "countryiso3code": code.upper(),
+                            "date": str(2023 - offset),
+                            "value": round(stable_value(code, indicator, offset) * 100, 2),
+                        }
+                    )
+        return [{"page": 1, "pages": 1, "total": len(rows)}, rows]
+
+    def opendatasoft(self, params: Dict[str, List[str]]) -> Any:
+        dataset = params.get("dataset", [""])[0]
+        if dataset == "numbeo":
+            rows = int(params.get("rows", ["1"])[0])
+            records = [
+                {"fields": {"city": f"City {idx}", "country": name, "price_to_buy_apartment_city_centre_usd": 2500}}
+                for idx, (_, _, name) in enumerate(MOCK_COUNTRIES)
+            ]
+            return {"nhits": len(records), "records": records[:rows]}
+        country_code = params.get("refine.country_code", ["MX"])[0]
+        country_name = next((name for iso2, _, name in MOCK_COUNTRIES if iso2 == country_code), country_code)
+        start = int(params.get("start", ["0"])[0])
+        rows = int(params.get("rows", ["10"])[0])
+        floor = params.get("q", [""])[0].partition("<=")[2]
+        cities = [
+            (idx, 5_000_000 // (idx + 1))
+            for idx in range(self.cities_per_country)
+            if not floor or 5_000_000 // (idx + 1) <= int(floor)
+        ]
+        records = [
+            {
+                "recordid": f"{country_code}-{idx}",
+                "fields": {
+                    "name": f"City {idx}",
+                    "cou_name_en": country_name,
+                    "population": population,
+                    "coordinates": [19.0 + idx * 0.001, -99.0 + idx * 0.001],
+                },
+            }
+            for idx, population in cities[start : start + rows]
+        ]
+        return {"nhits": len(cities), "records": records}
+
+    def overpass_status(self) -> str:
+        return "Connected as: 1\nRate limit: 2\n2 slots available now.\nCurrently running queries:\n"
+
+    def overpass(self, query: str) -> Any:
+        csv_columns = re.search(r"\[out:csv\(([^;)]*)", query)
+        if csv_columns:
+            columns = [column.strip() for column in csv_columns.group(1).split(",")]
+            limit = re.search(r"\bout [^;]*?(\d+);", query)
+            elements = self.overpass("")["elements"][: int(limit.group(1)) if limit else None]
+            values = {"::lat": "lat", "::lon": "lon"}
+            rows = [
+                [
+                    str(element[values[column]]) if column in values else element["tags"].get(column, "")
+                    for column in columns
+                ]
+                for element in elements
+            ]
+            if "out count" in query:
+                rows.append([str(len(elements)) if column == "::count" else "" for column in columns])
+            return "".join("\t".join(row) + "\n" for row in rows)
+        if "out count" in query:
+            return {
+                "elements": [
+                    {"type": "count", "tags": {"total": str(int(stable_value(query, idx) * 50))}}
+                    for idx in range(query.count("out count"))
+                ]
+            }
+        elements = []
+        for idx in range(MOCK_POIS):
+            key, value = MOCK_TAGS[idx % len(MOCK_TAGS)]
+            elements.append(
+                {
+                    "type": "node",
+                    "id": idx,
+                    "lat": 19.0 + (idx % 20) * 0.005,
+                    "lon": -99.0 + (idx // 20) * 0.005,
+                    "tags": {"name": f"POI {idx}", key: value},
+                }
+            )
+        return {"elements": elements}
+
+    def _handler(self) -> type:
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                self.reply(b"")
+
+            def do_POST(self) -> None:
+                self.reply(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+
+            def reply(self, body: bytes) -> None:
+                parts = urlsplit(self.path)
+                status, content_type, data = upstream.respond(self.command, parts.path, parts.query, body)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                if status == 503:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        return Handler
+
+
+class MockRedis:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._data: Dict[bytes, Tuple[bytes, float]] = {}
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f"redis://127.0.0.1:{self._server.server_address[1]}/0"
+
+    def start(self) -> "MockRedis":
+        threading.Thread(target=self._server.serve_forever, name="mock-redis", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._data = {}
+
+    def execute(self, args: List[bytes]) -> bytes:
+        name = args[0].upper()
+        with self._lock:
+            if name == b"GET":
+                entry = self._data.get(args[1])
+                if entry is None or entry[1] <= time.time():
+                    return b"$-1\r\n"
+                return b"$%d\r\n%s\r\n" % (len(entry[0]), entry[0])
+            if name == b"SET":
+                options = [arg.upper() for arg in args[3:]]
+                ttl = int(options[options.index(b"PX") + 1]) / 1000 if b"PX" in options else 1e9
+                current = self._data.get(args[1])
+                if b"NX" in options and current is not None and current[1] > time.time():
+                    return b"$-1\r\n"
+                self._data[args[1]] = (args[2], time.time() + ttl)
+                return b"+OK\r\n"
+            if name == b"DEL":
+                removed = sum(self._data.pop(key, None) is not None for key in args[1:])
+                return b":%d\r\n" % removed
+            if name in (b"PING", b"AUTH", b"SELECT"):
+                return b"+OK\r\n"
+        return b"-ERR unknown command\r\n"
+
+    def _handler(self) -> type:
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                while True:
+                    header = self.rfile.readline()
+                    if not header.startswith(b"*"):
+                        return
+                    args = []
+                    for _ in range(int(header[1:])):
+                        size = int(self.rfile.readline()[1:])
+                        args.append(self.rfile.read(size + 2)[:-2])
+                    self.wfile.write(server.execute(args))
+
+        return Handler
+
+
+class Bench:
+    def __init__(self, upstream: MockUpstream, cache_dir: str, redis: Optional[MockRedis] = None) -> None:
+        self.upstream = upstream
+        self.cache_dir = cache_dir
+        self.redis = redis
+        self.results: List[Dict[str, Any]] = []
+
+    def measure(self, name: str, run: Callable[[], None]) -> None:
+        self.upstream.wait_idle()
+        self.upstream.reset()
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        self.upstream.wait_idle()
+        counts, errors = self.upstream.snapshot()
+        self.results.append(
+            {
+                "scenario": name,
+                "seconds": round(elapsed, 3),
+                "requests": sum(counts.values()),
+                "by_upstream": counts,
+                "injected_errors": errors,
+            }
+        )
+        print(f"{name}: {elapsed:.2f}s, {sum(counts.values())} requests", file=sys.stderr, flush=True)
+
+    def clear_memory(self) -> None:
+        import streamlit as st
+
+        st.cache_data.clear()
+        st.cache_resource.clear()
+
+    def clear_local(self) -> None:
+        self.clear_memory()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def clear_all(self) -> None:
+        self.clear_local()
+        if self.redis is not None:
+            self.redis.flush()
+
+
+def app_test() -> Any:
+    from streamlit.testing.v1 import AppTest
+
+    return AppTest.from_file(APP_PATH, default_timeout=300)
+
+
+def run_app(at: Any) -> Any:
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return at
+
+
+def run_concurrently(run: Callable[[], None], count: int) -> None:
+    errors: List[BaseException] = []
+
+    def session() -> None:
+        try:
+            run()
+        except BaseException as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=session, name=f"session-{idx}") for idx in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def run_scenarios(bench: Bench, categories: int, sessions: int) -> None:
+    import main as radar
+
+    lang = "es"
+    country_code, country_iso3, _ = MOCK_COUNTRIES[0]
+
+    def fetchers() -> None:
+        radar.fetch_countries.strict()
+        radar.fetch_country_indicators.strict((country_iso3,))
+        radar.fetch_indicator_frame.strict((country_iso3,), radar.SERIES_INDICATORS, *radar.series_years())
+        cities = radar.fetch_worldcities.strict(country_code)
+        for city in cities.top_by_population(3):
+            radar.fetch_competitor_counts.strict(
+                city.name, country_code, radar.REC_CANDIDATES, city.lat, city.lon, radar.DEFAULT_RADIUS_KM * 1000
+            )
+
+    bench.clear_all()
+    bench.measure("fetchers_cold", fetchers)
+    bench.measure("fetchers_warm", fetchers)
+    # AppTest cannot run two scripts at once, so concurrent sessions are
+    # modelled at the fetcher layer; this should cost what fetchers_cold did.
+    bench.clear_all()
+    bench.measure("fetchers_concurrent", lambda: run_concurrently(fetchers, sessions))
+
+    bench.clear_all()
+    at = app_test()
+    bench.measure("app_cold", lambda: run_app(at))
+    bench.measure("app_warm", lambda: run_app(app_test()))
+    bench.clear_memory()
+    bench.measure("app_warm_disk", lambda: run_app(app_test()))
+
+    def radius_change() -> None:
+        radius = next(s for s in at.sidebar.slider if s.label == radar.t(lang, "radius_km"))
+        radius.set_value(radar.DEFAULT_RADIUS_KM + 5)
+        run_app(at)
+
+    bench.measure("radius_change", radius_change)
+
+    def category_sweep() -> None:
+        for category in list(radar.BUSINESS_OSM_MAP)[:categories]:
+            select = next(s for s in at.selectbox if s.label == radar.t(lang, "business_category"))
+            select.set_value(category)
+            run_app(at)
+
+    bench.measure("category_sweep", category_sweep)
+
+    if bench.redis is not None:
+        # A fresh replica: no memory or disk cache, only the shared tier.
+        bench.clear_local()
+        bench.measure("app_cold_replica", lambda: run_app(app_test()))
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str) -> List[str]:
+    with open(baseline_path, encoding="utf-8") as handle:
+        baseline = {row["scenario"]: row for row in json.load(handle)}
+    regressions = []
+    for row in results:
+        previous = baseline.get(row["scenario"])
+        if previous and row["requests"] > previous["requests"]:
+            regressions.append(f"{row['scenario']}: {previous['requests']} -> {row['requests']} requests")
+    return regressions
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="bench.py", description="Benchmark Investment Radar against a local mock.")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Mean upstream latency per request.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with HTTP 503.")
+    parser.add_argument("--cities", type=int, default=1500, help="Cities served per country.")
+    parser.add_argument("--categories", type=int, default=5, help="Categories visited by the category sweep.")
+    parser.add_argument("--sessions", type=int, default=4, help="Sessions started at once by fetchers_concurrent.")
+    parser.add_argument("--fixtures", help="Replay recorded responses from this directory.")
+    parser.add_argument("--record", action="store_true", help="Fetch and store missing fixtures from live upstreams.")
+    parser.add_argument("--redis", action="store_true", help="Share cached responses through a local Redis stand-in.")
+    parser.add_argument("--json", help="Write the results to this file.")
+    parser.add_argument("--baseline", help="Fail when a scenario makes more requests than in this results file.")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.record and not args.fixtures:
+        print("--record needs --fixtures.", file=sys.stderr)
+        return 2
+    upstream = MockUpstream(args.latency_ms, args.error_rate, args.cities, args.fixtures, args.record).start()
+    cache_dir = tempfile.mkdtemp(prefix="radar-bench-")
+    # The app reads its endpoints and cache paths at import time.
+    os.environ.update(upstream.env())
+    os.environ["RADAR_CACHE_PATH"] = os.path.join(cache_dir, "http.sqlite3")
+    os.environ["RADAR_FEATURES_PATH"] = os.path.join(cache_dir, "features.sqlite3")
+    os.environ["RADAR_METRICS_PATH"] = ""
+    redis = MockRedis().start() if args.redis else None
+    os.environ["RADAR_SHARED_CACHE_URL"] = redis.url if redis else ""
+    for name in ("RADAR_OFFLINE", "RADAR_WARMUP"):
+        os.environ.pop(name, None)
+
+    from streamlit import logger as st_logger
+
+    st_logger.set_log_level("error")
+    bench = Bench(upstream, cache_dir, redis)
+    try:
+        run_scenarios(bench, args.categories, args.sessions)
+    finally:
+        upstream.stop()
+        if redis is not None:
+            redis.stop()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print(f"{'scenario':<20}{'seconds':>10}{'requests':>10}  by upstream")
+    for row in bench.results:
+        upstreams = ", ".join(f"{name}={count}" for name, count in sorted(row["by_upstream"].items()))
+        print(f"{row['scenario']:<20}{row['seconds']:>10.3f}{row['requests']:>10}  {upstreams}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(bench.results, handle, indent=2)
+    if args.baseline:
+        regressions = compare(bench.results, args.baseline)
+        if regressions:
+            print("Request count regressions:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from streamlit import logger as st_logger
+
+# Cached fetchers warn about the missing Streamlit runtime on import.
+st_logger.set_log_level("error")
+
+import main as radar  # noqa: E402
+
+
+def print_progress(section: str, done: int, total: int) -> None:
+    print(f"\r{section}: {done}/{total}", end="\n" if done >= total else "", file=sys.stderr, flush=True)
+
+
+def run_snapshot(args: argparse.Namespace) -> int:
+    if radar.SNAPSHOT_OFFLINE:
+        print("Unset RADAR_OFFLINE to build or refresh the snapshot.", file=sys.stderr)
+        return 2
+    # A full build goes to a side file so a running app keeps reading the old snapshot.
+    path = f"{args.path}.tmp" if args.action == "build" else args.path
+    if args.action == "build" and os.path.exists(path):
+        os.remove(path)
+    store = radar.SnapshotStore(path)
+    sections = tuple(args.sections or radar.SNAPSHOT_SECTIONS)
+    try:
+        failures = radar.build_snapshot(store, sections, print_progress)
+    except radar.FetchError as exc:
+        print(f"Snapshot failed: {exc}", file=sys.stderr)
+        return 1
+    for name, (built_at, rows) in sorted(store.sections().items()):
+        print(f"{name}: {rows} rows (built {built_at})")
+    store.close()
+    if path != args.path:
+        os.replace(path, args.path)
+    if failures:
+        print(f"Missing: {', '.join(failures)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def run_warmup(args: argparse.Namespace) -> int:
+    if radar.SNAPSHOT_OFFLINE:
+        print("Warm-up fetches live data; unset RADAR_OFFLINE first.", file=sys.stderr)
+        return 2
+    worker = radar.WarmupWorker(tuple(code.upper() for code in args.countries), pause=args.pause)
+    cold = worker.run(print_progress)
+    if cold:
+        print("Still cold:", file=sys.stderr)
+        for label in cold:
+            print(f"  {label}", file=sys.stderr)
+        return 1
+    print(f"Warmed {len(args.countries)} countries.")
+    return 0
+
+
+def run_features(args: argparse.Namespace) -> int:
+    countries = radar.fetch_countries()
+    if not countries:
+        print("Could not load the country list.", file=sys.stderr)
+        return 1
+    if args.countries:
+        codes = {code.upper() for code in args.countries}
+        countries = [country for country in countries if country[0].upper() in codes]
+    store = radar.FeatureStore(args.path)
+    try:
+        refreshed, failures = radar.refresh_features(store, countries, args.force, print_progress)
+    except radar.FetchError as exc:
+        print(f"Feature refresh failed: {exc}", file=sys.stderr)
+        return 1
+    print(f"Refreshed {len(refreshed)} of {len(countries)} countries.")
+    if failures:
+        print("Failed:", file=sys.stderr)
+        for failure in failures:
+            print(f"  {failure}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def run_poi(args: argparse.Namespace) -> int:
+    countries = radar.fetch_countries()
+    if args.countries:
+        codes = {code.upper() for code in args.countries}
+        countries = [country for country in countries if country[0].upper() in codes]
+    if not countries:
+        print("No matching countries.", file=sys.stderr)
+        return 1
+    store = radar.FeatureStore(args.path)
+    built, failures = radar.build_poi_matrix(
+        store,
+        store.load(),
+        [(iso2, iso3) for iso2, iso3, _ in countries],
+        tuple(args.categories),
+        int(args.radius_km * 1000),
+        print_progress,
+    )
+    print(f"Counted {len(args.categories)} categories in {len(built)} of {len(countries)} countries.")
+    if failures:
+        print("Failed:", file=sys.stderr)
+        for failure in failures:
+            print(f"  {failure}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def write_country_report(
+    out_dir: str,
+    country: Tuple[str, str, str],
+    indicators: Dict[str, Tuple[Optional[float], Optional[int]]],
+    series: pd.DataFrame,
+    city_name: Optional[str],
+    categories: Tuple[str, ...],
+) -> str:
+    iso2, iso3, name = country
+    state = radar.PageState(
+        lang="en",
+        country_name=name,
+        iso2=iso2,
+        iso3=iso3,
+        indicators=indicators,
+        weights=dict(radar.DEFAULT_WEIGHTS),
+        radius_m=radar.DEFAULT_RADIUS_KM * 1000,
+    )
+    # Country-level inputs are shared by every city, so the score order follows
+    # population and the largest cities of the first page hold the whole top 10.
+    cities = radar.fetch_worldcities.strict(iso2)
+    _, ranked = radar.rank_country_cities(state, cities.frame(), 10)
+    city_choice = city_name or (ranked[0][0] if ranked else "-")
+    city = cities.find(city_choice)
+    city_cost = radar.fetch_city_cost_m2(city_choice, name)
+    competitors = None
+    if categories:
+        competitors = radar.fetch_competitor_counts.strict(
+            city_choice,
+            iso2,
+            categories,
+            city.lat if city else None,
+            city.lon if city else None,
+            state.radius_m,
+        )
+    potential_clients = radar.estimate_potential_clients(state, city)
+
+    country_dir = os.path.join(out_dir, iso3)
+    os.makedirs(country_dir, exist_ok=True)
+    files = {
+        f"country_{iso3}.csv": radar.build_country_csv(state),
+        f"cities_{iso3}.csv": radar.build_cities_csv(ranked),
+        f"report_{iso3}.txt": radar.build_report_text(state, city_choice, city_cost, potential_clients, competitors),
+        f"series_{iso3}.csv": radar.build_series_csv(series),
+    }
+    for file_name, content in files.items():
+        with open(os.path.join(country_dir, file_name), "w", encoding="utf-8", newline="") as handle:
+            handle.write(content)
+    return country_dir
+
+
+def run_report(args: argparse.Namespace) -> int:
+    countries = {iso2.upper(): (iso2, iso3, name) for iso2, iso3, name in radar.fetch_countries()}
+    if not countries:
+        print("Could not load the country list.", file=sys.stderr)
+        return 1
+    codes = [code.upper() for code in args.countries] if args.countries else sorted(countries)
+    unknown = [code for code in codes if code not in countries]
+    selected = [countries[code] for code in codes if code in countries]
+    city_names = dict(args.city)
+    iso3_codes = tuple(iso3 for _, iso3, _ in selected)
+    indicators = radar.fetch_country_indicators(iso3_codes)
+    series = radar.fetch_indicator_frame(iso3_codes, radar.SERIES_INDICATORS, *radar.series_years())
+    categories = tuple(args.categories or ())
+
+    failures = [f"{code}: unknown country" for code in unknown]
+    selected_codes = {iso2.upper() for iso2, _, _ in selected}
+    failures += [
+        f"{code}: --city given for a country not in this report" for code in city_names if code not in selected_codes
+    ]
+    written = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {
+            pool.submit(
+                write_country_report,
+                args.out,
+                country,
+                indicators.get(country[1]) or radar.empty_country_indicators(),
+                series[series["country"] == country[1]],
+                city_names.get(country[0].upper()),
+                categories,
+            ): country
+            for country in selected
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                future.result()
+                written += 1
+            except radar.FetchError as exc:
+                failures.append(f"{futures[future][0]}: {exc}")
+            print_progress("report", done, len(futures))
+    print(f"Wrote {written} reports to {args.out}")
+    if failures:
+        print("Failed:", file=sys.stderr)
+        for failure in failures:
+            print(f"  {failure}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def city_option(value: str) -> Tuple[str, str]:
+    code, sep, city = value.partition("=")
+    if not sep or not code.strip() or not city.strip():
+        raise argparse.ArgumentTypeError("expected ISO2=City")
+    return code.strip().upper(), city.strip()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli.py", description="Investment Radar command line tools.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    snapshot = commands.add_parser("snapshot", help="Build or refresh the offline data snapshot.")
+    snapshot.add_argument("action", choices=["build", "refresh"])
+    snapshot.add_argument("--path", default=radar.SNAPSHOT_PATH)
+    snapshot.add_argument("--sections", nargs="+", choices=radar.SNAPSHOT_SECTIONS)
+    snapshot.set_defaults(handler=run_snapshot)
+
+    warmup = commands.add_parser("warmup", help="Pre-populate the HTTP cache for popular countries.")
+    warmup.add_argument("--countries", nargs="+", default=list(radar.WARMUP_COUNTRIES), metavar="ISO2")
+    warmup.add_argument("--pause", type=float, default=radar.WARMUP_PAUSE_SECONDS)
+    warmup.set_defaults(handler=run_warmup)
+
+    features = commands.add_parser("features", help="Rebuild city score features whose indicators changed.")
+    features.add_argument("action", choices=["refresh"])
+    features.add_argument("--countries", nargs="+", metavar="ISO2", help="Defaults to every country.")
+    features.add_argument("--force", action="store_true", help="Rebuild even when the indicator years match.")
+    features.add_argument("--path", default=radar.FEATURES_PATH)
+    features.set_defaults(handler=run_features)
+
+    poi = commands.add_parser("poi", help="Count competitors around the largest cities of each country.")
+    poi.add_argument("action", choices=["build"])
+    poi.add_argument("--countries", nargs="+", metavar="ISO2", help="Defaults to every country.")
+    poi.add_argument(
+        "--categories", nargs="+", choices=list(radar.BUSINESS_OSM_MAP), default=list(radar.REC_CANDIDATES)
+    )
+    poi.add_argument("--radius-km", type=float, default=radar.DEFAULT_RADIUS_KM)
+    poi.add_argument("--path", default=radar.FEATURES_PATH)
+    poi.set_defaults(handler=run_poi)
+
+    report = commands.add_parser("report", help="Write the country, cities and report exports for many markets.")
+    report.add_argument("--countries", nargs="+", metavar="ISO2", help="Defaults to every country.")
+    report.add_argument("--city", action="append", default=[], type=city_option, metavar="ISO2=CITY")
+    report.add_argument("--categories", nargs="+", choices=list(radar.BUSINESS_OSM_MAP))
+    report.add_argument("--out", default="reports")
+    report.add_argument("--workers", type=int, default=radar.FETCH_WORKERS)
+    report.set_defaults(handler=run_report)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    status = args.handler(args)
+    if radar.METRICS_PATH:
+        radar.get_metrics().write(radar.METRICS_PATH, "cli")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
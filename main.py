@@ -1,20 +1,178 @@
+import bisect
+import contextlib
+import copy
 import csv
+import functools
+import hashlib
+import re
 import io
+import json
 import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
 from datetime import datetime
 import textwrap
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
 
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import streamlit as st
 import pydeck as pdk
 import pandas as pd
 import altair as alt
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from streamlit.runtime.scriptrunner_utils.script_run_context import SCRIPT_RUN_CONTEXT_ATTR_NAME
 
-WB_BASE = "https://api.worldbank.org/v2"
-ODS_BASE = "https://public.opendatasoft.com/api/records/1.0/search/"
-OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+WB_BASE = os.environ.get("RADAR_WB_BASE", "https://api.worldbank.org/v2")
+ODS_BASE = os.environ.get("RADAR_ODS_BASE", "https://public.opendatasoft.com/api/records/1.0/search/")
+OVERPASS_URL = os.environ.get("RADAR_OVERPASS_URL", "https://overpass-api.de/api/interpreter")
+# Tried in order; add a local instance first to keep public mirrors as a fallback.
+OVERPASS_URLS = tuple(
+    url.strip()
+    for url in os.environ.get(
+        "RADAR_OVERPASS_URLS", f"{OVERPASS_URL},https://overpass.kumi.systems/api/interpreter"
+    ).split(",")
+    if url.strip()
+)
+OVERPASS_MAX_RATE = 1.0
+OVERPASS_MIN_RATE = 0.05
+OVERPASS_ATTEMPTS = 3
+OVERPASS_STATUS_TTL = 30
+OVERPASS_COOLDOWN_SECONDS = 5
+OVERPASS_MAX_COOLDOWN_SECONDS = 120
+OVERPASS_MAX_WAIT_SECONDS = 30
+OVERPASS_NAME_LIMIT = 500
+OVERPASS_CHUNK_BYTES = 64 * 1024
+# Remarks that mean the instance is out of slots or overloaded, as opposed to
+# a query that timed out or ran out of memory on its own.
+OVERPASS_RATE_REMARKS = ("rate_limited", "request_read_and_idx::timeout")
+
+WDI_SOURCE = "2"
+WGI_SOURCE = "3"
+WB_BATCH_COUNTRIES = 40
+
+COUNTRY_INDICATORS = {
+    "gdp": "NY.GDP.MKTP.CD",
+    "gdp_pc": "NY.GDP.PCAP.CD",
+    "population": "SP.POP.TOTL",
+    "density": "EN.POP.DNST",
+    "inflation": "FP.CPI.TOTL.ZG",
+    "unemployment": "SL.UEM.TOTL.ZS",
+    "growth": "NY.GDP.MKTP.KD.ZG",
+    "tax_revenue": "GC.TAX.TOTL.GD.ZS",
+    "current_account": "BN.CAB.XOKA.GD.ZS",
+    "median_age": "SP.POP.MEDN",
+    "urbanization": "SP.URB.TOTL.IN.ZS",
+    "labor_force": "SL.TLF.CACT.ZS",
+}
+WGI_INDICATORS = ("CC.EST", "GE.EST", "PV.EST", "RL.EST", "RQ.EST", "VA.EST")
+# Multi-indicator requests must name a single source; WGI lives outside WDI.
+INDICATOR_SOURCES = {indicator: WGI_SOURCE for indicator in WGI_INDICATORS}
+
+FETCH_WORKERS = 8
+HTTP_RETRIES = 3
+HTTP_BACKOFF_SECONDS = 0.5
+HTTP_BACKOFF_MAX_SECONDS = 30
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+DEFAULT_HOST_CONCURRENCY = 4
+# The public Overpass instance allows very few parallel slots per client.
+HOST_CONCURRENCY = {"overpass-api.de": 2, "overpass.kumi.systems": 2}
+
+CITIES_DATASET = "geonames-all-cities-with-a-population-1000"
+CITY_PAGE_SIZE = 1000
+CITY_LOAD_LIMIT = 100000
+# A session retries a failed city load on its own only after this long.
+CITY_RETRY_SECONDS = 300
+# The city picker lists the ranked and largest cities; the rest are reached by search.
+CITY_OPTIONS = 200
+MULTI_RANK_TOP_K = 25
+# OpenDataSoft v1 search refuses start + rows beyond this window.
+ODS_MAX_WINDOW = 10000
+
+POI_INDEX_RADIUS_M = 30000
+# The category search counts competitors around each country's largest cities
+# from one country-wide Overpass extract.
+POI_MATRIX_CITIES = 200
+POI_MATRIX_TIMEOUT = 900
+DEFAULT_RADIUS_KM = 10
+POI_INDEX_TIMEOUT = 180
+# Zone and mall/office name lists cover a smaller area than the POI extract.
+AREA_NAMES_RADIUS_M = 15000
+ZONE_NAME_TYPES = ("neighbourhood", "suburb")
+ZONE_TYPES = ("neighbourhood", "suburb", "quarter", "district")
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+CACHE_PATH = os.environ.get("RADAR_CACHE_PATH", os.path.join(DATA_DIR, "http.sqlite3"))
+CACHE_MAX_BYTES = int(os.environ.get("RADAR_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+CACHE_STALE_SECONDS = 7 * 86400
+# Other processes write to the same cache file, so the running size total is
+# re-read from disk at least this often.
+CACHE_SIZE_SYNC_SECONDS = 300
+DEFAULT_SOURCE_TTL = 3600
+SOURCE_TTLS = {
+    "api.worldbank.org": 86400,
+    "public.opendatasoft.com": 86400,
+    "overpass-api.de": 3600,
+}
+
+# A redis:// URL shares cached responses between replicas; without one the
+# shared tier is skipped, since the disk and st.cache_data tiers already hold
+# every response in this process.
+SHARED_CACHE_URL = os.environ.get("RADAR_SHARED_CACHE_URL", "")
+SHARED_LOCK_SECONDS = 120
+SHARED_WAIT_SECONDS = 60
+SHARED_POLL_SECONDS = 0.2
+SHARED_RETRY_SECONDS = 30
+
+# Per-city score inputs for every country, rebuilt per country when the latest
+# year of one of its indicators moves.
+FEATURES_PATH = os.environ.get("RADAR_FEATURES_PATH", os.path.join(DATA_DIR, "features.sqlite3"))
+
+# Each process writes its own file next to this path, e.g. metrics.app.prom and
+# metrics.cli.prom, so the app and cli.py never overwrite each other's counters.
+METRICS_PATH = os.environ.get("RADAR_METRICS_PATH", os.path.join(DATA_DIR, "metrics.prom"))
+
+SNAPSHOT_PATH = os.environ.get("RADAR_SNAPSHOT_PATH", os.path.join(DATA_DIR, "snapshot.sqlite3"))
+# When set, every fetcher reads from the snapshot and no upstream API is called.
+SNAPSHOT_OFFLINE = os.environ.get("RADAR_OFFLINE", "") not in ("", "0", "false")
+SNAPSHOT_YEARS = 15
+SNAPSHOT_SECTIONS = ("countries", "indicators", "cities", "costs")
+SERIES_INDICATORS = ("NY.GDP.MKTP.CD", "FP.CPI.TOTL.ZG", "SL.UEM.TOTL.ZS")
+SERIES_YEARS = 12
+SERIES_COMPARE_MAX = 6
+WARMUP_COUNTRIES = tuple(
+    code.strip().upper()
+    for code in os.environ.get("RADAR_WARMUP_COUNTRIES", "MX,US,ES,AR,CO,CL,BR,PE").split(",")
+    if code.strip()
+)
+WARMUP_ON_START = os.environ.get("RADAR_WARMUP", "") not in ("", "0", "false")
+WARMUP_TOP_CITIES = 3
+WARMUP_PAUSE_SECONDS = 0.5
+EXPORT_COUNTRY_FIELDS = (
+    "gdp",
+    "gdp_pc",
+    "population",
+    "density",
+    "inflation",
+    "unemployment",
+    "growth",
+    "tax_revenue",
+    "current_account",
+    "median_age",
+    "urbanization",
+    "labor_force",
+    "risk_score",
+)
+COST_FIELDS = ("price_to_buy_apartment_city_centre_usd", "price_to_buy_apartment_city_centre")
 
 
 I18N = {
@@ -24,6 +182,7 @@ I18N = {
         "language": "Idioma",
         "country": "Pais",
         "city": "Ciudad",
+        "city_search": "Buscar ciudad",
         "top_cities": "Top 3 ciudades para inversion",
         "investment_hint": "Selecciona una ciudad y un negocio para sugerencias y competencia.",
         "business_category": "Categoria de negocio (120 opciones)",
@@ -56,6 +215,7 @@ I18N = {
         "zones_empty": "No se encontraron zonas (intenta otra ciudad).",
         "pois_empty": "No se encontraron centros comerciales u oficinas.",
         "category_empty": "No se encontraron competidores con esa categoria.",
+        "overpass_failed": "OpenStreetMap no respondio; los datos de esta seccion no estan disponibles ahora.",
         "sources": "Fuentes: World Bank API, OpenDataSoft, OpenStreetMap (Overpass).",
         "cost_note": "El costo por m2 depende de datasets publicos por ciudad y puede no estar disponible.",
         "rent_note": "El alquiler mensual no tiene fuente global abierta; se muestra solo si hay datos.",
@@ -84,6 +244,7 @@ I18N = {
         "download_country": "Descargar indicadores pais (CSV)",
         "download_cities": "Descargar top ciudades (CSV)",
         "download_report": "Descargar reporte (TXT)",
+        "download_series": "Descargar series (CSV)",
         "map_empty": "No hay puntos para mostrar en el mapa.",
         "best_hint": "Esto puede tardar por consultas a OpenStreetMap.",
         "top_n": "Top N",
@@ -104,6 +265,7 @@ I18N = {
         "export_watchlist": "Descargar seguimiento (CSV)",
         "series_block": "Series historicas",
         "series_hint": "Ultimos anos disponibles (World Bank).",
+        "series_compare": "Comparar con",
         "recommendations": "Recomendaciones",
         "recommendation_note": "Categorias con baja competencia y alta demanda.",
         "city_compare_chart": "Comparativo de ciudades",
@@ -120,6 +282,23 @@ I18N = {
         "latest_year_label": "Ultimo ano",
         "cities_indexed_label": "Ciudades indexadas",
         "top_city_pop_label": "Poblacion ciudad top",
+        "cities_loading": "Cargando mas ciudades... {count} hasta ahora",
+        "cities_failed": "No se pudieron cargar todas las ciudades; se muestran {count}.",
+        "cities_retry": "Reintentar carga de ciudades",
+        "multi_rank_block": "Ranking de ciudades entre paises",
+        "multi_rank_all": "Incluir todos los paises",
+        "debug_panel": "Depuracion: llamadas y tiempos",
+        "multi_rank_note": "Puntua las ciudades mas pobladas de cada pais con sus datos de pais.",
+        "warmup_progress": "Precarga: {done}/{total} paises",
+        "warmup_cold": "Sin precargar",
+        "best_city_block": "Mejor ciudad para una categoria",
+        "best_city_note": "Indice de demanda dividido por la densidad de competidores en el radio elegido.",
+        "best_city_missing": "Sin conteos de competidores para: {countries}",
+        "best_city_unindexed": "Ciudades sin indexar (abre el pais o ejecuta cli.py features refresh): {countries}",
+        "best_city_build": "Calcular conteos",
+        "best_city_building": "Calculando conteos en segundo plano para: {countries}",
+        "best_city_density": "Competidores por km2",
+        "best_city_score": "Oportunidad",
     },
     "en": {
         "app_title": "Global Investment Radar",
@@ -127,6 +306,7 @@ I18N = {
         "language": "Language",
         "country": "Country",
         "city": "City",
+        "city_search": "Search city",
         "top_cities": "Top 3 cities for investment",
         "investment_hint": "Pick a city and a business to see suggestions and competition.",
         "business_category": "Business category (120 options)",
@@ -159,6 +339,7 @@ I18N = {
         "zones_empty": "No zones found (try another city).",
         "pois_empty": "No malls or offices found.",
         "category_empty": "No competitors found for this category.",
+        "overpass_failed": "OpenStreetMap did not respond; this section's data is unavailable right now.",
         "sources": "Sources: World Bank API, OpenDataSoft, OpenStreetMap (Overpass).",
         "cost_note": "Cost per m2 depends on public city datasets and may be unavailable.",
         "rent_note": "Monthly rent lacks a global open dataset; shown only when available.",
@@ -187,6 +368,7 @@ I18N = {
         "download_country": "Download country indicators (CSV)",
         "download_cities": "Download top cities (CSV)",
         "download_report": "Download report (TXT)",
+        "download_series": "Download series (CSV)",
         "map_empty": "No points to show on map.",
         "best_hint": "This can take time due to OpenStreetMap queries.",
         "top_n": "Top N",
@@ -207,6 +389,7 @@ I18N = {
         "export_watchlist": "Download watchlist (CSV)",
         "series_block": "Historical series",
         "series_hint": "Latest available years (World Bank).",
+        "series_compare": "Compare with",
         "recommendations": "Recommendations",
         "recommendation_note": "Low competition and high demand categories.",
         "city_compare_chart": "City comparison",
@@ -223,6 +406,23 @@ I18N = {
         "latest_year_label": "Latest year",
         "cities_indexed_label": "Cities indexed",
         "top_city_pop_label": "Top city population",
+        "cities_loading": "Loading more cities... {count} so far",
+        "cities_failed": "Not every city could be loaded; showing {count}.",
+        "cities_retry": "Retry loading cities",
+        "multi_rank_block": "Cross-country city ranking",
+        "multi_rank_all": "Include all countries",
+        "debug_panel": "Debug: calls and timings",
+        "multi_rank_note": "Scores each country's largest cities with that country's data.",
+        "warmup_progress": "Warm-up: {done}/{total} countries",
+        "warmup_cold": "Still cold",
+        "best_city_block": "Best city for a category",
+        "best_city_note": "Demand index divided by competitor density within the chosen radius.",
+        "best_city_missing": "No competitor counts yet for: {countries}",
+        "best_city_unindexed": "City lists not indexed yet (open the country or run cli.py features refresh): {countries}",
+        "best_city_build": "Count competitors",
+        "best_city_building": "Counting competitors in the background for: {countries}",
+        "best_city_density": "Competitors per km2",
+        "best_city_score": "Opportunity",
     },
 }
 
@@ -452,7 +652,7 @@ BUSINESS_OSM_MAP = {
 }
 
 
-@dataclass
+@dataclass(slots=True)
 class CityRecord:
     name: str
     country: str
@@ -461,23 +661,723 @@ class CityRecord:
     lon: Optional[float]
 
 
-def t(lang: str, key: str) -> str:
-    return I18N.get(lang, I18N["en"]).get(key, key)
+class CityStore:
+    __slots__ = ("name", "country", "population", "lat", "lon")
 
+    def __init__(
+        self,
+        name: np.ndarray,
+        country: pd.Categorical,
+        population: np.ndarray,
+        lat: np.ndarray,
+        lon: np.ndarray,
+    ) -> None:
+        self.name = name
+        self.country = country
+        self.population = population
+        self.lat = lat
+        self.lon = lon
 
-@st.cache_data(show_spinner=False, ttl=86400)
-def fetch_json(url: str, params: Optional[Dict[str, str]] = None) -> Optional[dict]:
+    @classmethod
+    def from_records(cls, records: List[CityRecord]) -> "CityStore":
+        return cls(
+            np.array([record.name for record in records], dtype=object),
+            pd.Categorical([record.country for record in records]),
+            np.array([np.nan if record.population is None else record.population for record in records], dtype=float),
+            np.array([np.nan if record.lat is None else record.lat for record in records], dtype=float),
+            np.array([np.nan if record.lon is None else record.lon for record in records], dtype=float),
+        )
+
+    @classmethod
+    def empty(cls) -> "CityStore":
+        return cls.from_records([])
+
+    @classmethod
+    def concat(cls, stores: List["CityStore"]) -> "CityStore":
+        if not stores:
+            return cls.empty()
+        if len(stores) == 1:
+            return stores[0]
+        return cls(
+            np.concatenate([store.name for store in stores]),
+            pd.Categorical(np.concatenate([np.asarray(store.country, dtype=object) for store in stores])),
+            np.concatenate([store.population for store in stores]),
+            np.concatenate([store.lat for store in stores]),
+            np.concatenate([store.lon for store in stores]),
+        )
+
+    def __getstate__(self) -> Tuple[Any, ...]:
+        return self.name, self.country, self.population, self.lat, self.lon
+
+    def __setstate__(self, state: Tuple[Any, ...]) -> None:
+        self.name, self.country, self.population, self.lat, self.lon = state
+
+    def __len__(self) -> int:
+        return len(self.name)
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, (int, np.integer)):
+            return self.record(int(index))
+        return self.take(index)
+
+    def __iter__(self) -> Iterator[CityRecord]:
+        for idx in range(len(self)):
+            yield self.record(idx)
+
+    def record(self, idx: int) -> CityRecord:
+        population = self.population[idx]
+        lat = self.lat[idx]
+        lon = self.lon[idx]
+        return CityRecord(
+            name=self.name[idx],
+            country=self.country[idx],
+            population=None if np.isnan(population) else int(population),
+            lat=None if np.isnan(lat) else float(lat),
+            lon=None if np.isnan(lon) else float(lon),
+        )
+
+    def take(self, index: Any) -> "CityStore":
+        return CityStore(
+            self.name[index],
+            self.country[index],
+            self.population[index],
+            self.lat[index],
+            self.lon[index],
+        )
+
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "name": self.name,
+                "country": self.country,
+                "population": self.population,
+                "lat": self.lat,
+                "lon": self.lon,
+            }
+        )
+
+    def top_by_population(self, k: int) -> "CityStore":
+        populated = np.flatnonzero(self.population > 0)
+        order = top_k(self.population[populated], k)
+        return self.take(populated[order])
+
+    def max_population(self) -> int:
+        return int(np.nanmax(self.population, initial=0)) if len(self) else 0
+
+    def search(self, query: str, limit: int) -> "CityStore":
+        hits = pd.Series(self.name, dtype=object).str.contains(query, case=False, regex=False, na=False)
+        return self.take(np.flatnonzero(hits.to_numpy())[:limit])
+
+    def find(self, name: str) -> Optional[CityRecord]:
+        matches = np.flatnonzero(self.name == name)
+        return self.record(int(matches[0])) if len(matches) else None
+
+
+class FetchError(Exception):
+    pass
+
+
+def fallback(default: Any) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    def decorate(fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            try:
+                return fn(*args, **kwargs)
+            except FetchError:
+                return copy.deepcopy(default)
+
+        # Cached callers use the strict variant so an upstream failure is
+        # never memoised as an empty result further up the stack.
+        wrapper.strict = fn
+        return wrapper
+
+    return decorate
+
+
+@dataclass(slots=True)
+class CallRecord:
+    name: str
+    kind: str
+    parent: str = ""
+    cache: str = ""
+    status: str = ""
+    latency_ms: float = 0.0
+    bytes: int = 0
+    retries: int = 0
+
+
+class Metrics:
+    def __init__(self, max_sessions: int = 50, max_records: int = 2000) -> None:
+        self.max_sessions = max_sessions
+        self.max_records = max_records
+        self._lock = threading.Lock()
+        self._runs: Dict[str, List[CallRecord]] = {}
+        self._calls: Dict[Tuple[str, str, str, str], int] = {}
+        self._totals: Dict[Tuple[str, str], List[float]] = {}
+
+    def begin_run(self, session_id: str) -> None:
+        with self._lock:
+            self._runs.pop(session_id, None)
+            self._runs[session_id] = []
+            while len(self._runs) > self.max_sessions:
+                self._runs.pop(next(iter(self._runs)))
+
+    def record(self, record: CallRecord, session_id: Optional[str]) -> None:
+        with self._lock:
+            call_key = (record.name, record.kind, record.cache, record.status)
+            self._calls[call_key] = self._calls.get(call_key, 0) + 1
+            totals = self._totals.setdefault((record.name, record.kind), [0.0, 0.0, 0.0])
+            totals[0] += record.latency_ms / 1000
+            totals[1] += record.bytes
+            totals[2] += record.retries
+            run = self._runs.get(session_id) if session_id else None
+            if run is not None and len(run) < self.max_records:
+                run.append(record)
+
+    def run_records(self, session_id: str) -> List[CallRecord]:
+        with self._lock:
+            return list(self._runs.get(session_id, []))
+
+    def prometheus(self, process: str) -> str:
+        with self._lock:
+            calls = sorted(self._calls.items())
+            totals = sorted(self._totals.items())
+        lines = ["# TYPE radar_calls_total counter"]
+        for (name, kind, cache, status), count in calls:
+            lines.append(
+                f'radar_calls_total{{process="{process}",name="{name}",kind="{kind}",cache="{cache}",'
+                f'status="{status}"}} {count}'
+            )
+        for idx, metric in enumerate(("radar_call_seconds_total", "radar_response_bytes_total", "radar_retries_total")):
+            lines.append(f"# TYPE {metric} counter")
+            for (name, kind), values in totals:
+                lines.append(f'{metric}{{process="{process}",name="{name}",kind="{kind}"}} {values[idx]:g}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str, process: str) -> None:
+        root, ext = os.path.splitext(path)
+        path = f"{root}.{process}{ext}"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            handle.write(self.prometheus(process))
+        os.replace(tmp_path, path)
+
+
+@st.cache_resource(show_spinner=False)
+def get_metrics() -> Metrics:
+    return Metrics()
+
+
+_SPANS = threading.local()
+
+
+def current_session_id() -> Optional[str]:
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else None
+
+
+def current_span() -> Optional[CallRecord]:
+    stack = getattr(_SPANS, "stack", None)
+    return stack[-1] if stack else None
+
+
+@contextlib.contextmanager
+def span(name: str, kind: str) -> Iterator[CallRecord]:
+    stack = getattr(_SPANS, "stack", None)
+    if stack is None:
+        stack = _SPANS.stack = []
+    record = CallRecord(name=name, kind=kind, parent=stack[-1].name if stack else "")
+    stack.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception:
+        record.status = record.status or "error"
+        raise
+    finally:
+        record.latency_ms = (time.perf_counter() - start) * 1000
+        record.status = record.status or "ok"
+        stack.pop()
+        get_metrics().record(record, current_session_id())
+
+
+def cache_data(ttl: int) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    def decorate(fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def compute(*args: Any, **kwargs: Any) -> Any:
+            # Only runs when Streamlit has no cached value for these arguments.
+            record = current_span()
+            if record is not None:
+                record.cache = "miss"
+            return fn(*args, **kwargs)
+
+        cached = st.cache_data(show_spinner=False, ttl=ttl)(compute)
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(fn.__name__, "cache") as record:
+                record.cache = "hit"
+                return cached(*args, **kwargs)
+
+        wrapper.clear = cached.clear
+        return wrapper
+
+    return decorate
+
+
+def timed_section(fn: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        with span(fn.__name__, "section"):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def observe_response(record: CallRecord, response: requests.Response, body: bool = True) -> None:
+    record.status = str(response.status_code)
+    if body:
+        record.bytes = len(response.content)
+    retries = getattr(response.raw, "retries", None)
+    record.retries = len(retries.history) if retries is not None else 0
+
+
+@st.cache_resource(show_spinner=False)
+def get_http_session() -> requests.Session:
+    retry = Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF_SECONDS,
+        backoff_max=HTTP_BACKOFF_MAX_SECONDS,
+        backoff_jitter=HTTP_BACKOFF_SECONDS,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "POST"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=FETCH_WORKERS, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_HOST_SLOTS: Dict[str, threading.BoundedSemaphore] = {}
+_HOST_SLOTS_LOCK = threading.Lock()
+
+
+def host_slot(url: str) -> threading.BoundedSemaphore:
+    host = urlsplit(url).netloc
+    with _HOST_SLOTS_LOCK:
+        slot = _HOST_SLOTS.get(host)
+        if slot is None:
+            slot = threading.BoundedSemaphore(HOST_CONCURRENCY.get(host, DEFAULT_HOST_CONCURRENCY))
+            _HOST_SLOTS[host] = slot
+    return slot
+
+
+class FetchScheduler:
+    def __init__(self, max_workers: int = FETCH_WORKERS) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        ctx = get_script_run_ctx(suppress_warning=True)
+
+        def run() -> Any:
+            thread = threading.current_thread()
+            previous = get_script_run_ctx(suppress_warning=True)
+            if ctx is not None:
+                add_script_run_ctx(thread, ctx)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                # Pool threads outlive the session; don't leave its context on them.
+                setattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, previous)
+
+        return self._executor.submit(run)
+
+
+@st.cache_resource(show_spinner=False)
+def get_fetch_scheduler() -> FetchScheduler:
+    return FetchScheduler()
+
+
+def start_daemon(target: Callable[[], None], name: str) -> threading.Thread:
+    thread = threading.Thread(target=target, name=name, daemon=True)
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is not None:
+        add_script_run_ctx(thread, ctx)
+    thread.start()
+    return thread
+
+
+class DiskCache:
+    def __init__(self, path: str, max_bytes: int = CACHE_MAX_BYTES) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, source TEXT, value BLOB, size INTEGER, "
+            "stored_at REAL, accessed_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        self._conn.commit()
+        self._sync_size()
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        with self._lock:
+            row = self._conn.execute("SELECT value, stored_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        try:
+            return json.loads(zlib.decompress(row[0])), row[1]
+        except (zlib.error, ValueError):
+            return None
+
+    def set(self, key: str, source: str, value: Any, stored_at: Optional[float] = None) -> None:
+        blob = zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, source, value, size, stored_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, source, blob, len(blob), stored_at or now, now),
+            )
+            self._size += len(blob) - (previous[0] if previous else 0)
+            if self._size > self.max_bytes or now - self._synced_at > CACHE_SIZE_SYNC_SECONDS:
+                self._evict()
+            self._conn.commit()
+
+    def _sync_size(self) -> int:
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        self._synced_at = time.time()
+        return self._size
+
+    def _evict(self) -> None:
+        total = self._sync_size()
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute("SELECT key, size FROM entries ORDER BY accessed_at").fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= target:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        self._size = total
+
+
+@st.cache_resource(show_spinner=False)
+def get_disk_cache() -> Optional[DiskCache]:
+    if not CACHE_PATH:
+        return None
     try:
-        response = requests.get(url, params=params, timeout=30)
-        if response.status_code != 200:
+        return DiskCache(CACHE_PATH)
+    except sqlite3.Error:
+        return None
+
+
+class SharedCacheError(Exception):
+    pass
+
+
+def encode_command(args: Tuple[Any, ...]) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+def read_reply(reader: Any) -> Any:
+    line = reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("connection closed by the cache server")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode("utf-8")
+    if kind == b"-":
+        raise SharedCacheError(body.decode("utf-8"))
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        size = int(body)
+        if size < 0:
+            return None
+        data = reader.read(size + 2)
+        if len(data) != size + 2:
+            raise ConnectionError("connection closed by the cache server")
+        return data[:-2]
+    if kind == b"*":
+        size = int(body)
+        return None if size < 0 else [read_reply(reader) for _ in range(size)]
+    raise SharedCacheError(f"unexpected reply {line[:20]!r}")
+
+
+class RedisCache:
+    def __init__(self, url: str, timeout: float = 2.0) -> None:
+        parts = urlsplit(url)
+        self.address = (parts.hostname or "localhost", parts.port or 6379)
+        self.password = parts.password
+        self.db = int(parts.path.strip("/") or 0)
+        self.timeout = timeout
+        self.down_until = 0.0
+        self._lock = threading.Lock()
+        self._idle: List[Tuple[socket.socket, Any]] = []
+
+    def _connect(self) -> Tuple[socket.socket, Any]:
+        sock = socket.create_connection(self.address, timeout=self.timeout)
+        conn = (sock, sock.makefile("rb"))
+        if self.password:
+            self._send(conn, ("AUTH", self.password))
+        if self.db:
+            self._send(conn, ("SELECT", self.db))
+        return conn
+
+    def _send(self, conn: Tuple[socket.socket, Any], args: Tuple[Any, ...]) -> Any:
+        conn[0].sendall(encode_command(args))
+        return read_reply(conn[1])
+
+    def command(self, *args: Any) -> Any:
+        if time.time() < self.down_until:
+            raise ConnectionError("cache server marked down")
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is not None:
+            try:
+                reply = self._send(conn, args)
+            except OSError:
+                # The server drops idle connections; one stale socket is not an
+                # outage, so retry on a fresh connection before marking it down.
+                conn[0].close()
+                conn = None
+            except SharedCacheError:
+                conn[0].close()
+                self.down_until = time.time() + SHARED_RETRY_SECONDS
+                raise
+        if conn is None:
+            try:
+                conn = self._connect()
+                reply = self._send(conn, args)
+            except (OSError, SharedCacheError):
+                if conn is not None:
+                    conn[0].close()
+                self.down_until = time.time() + SHARED_RETRY_SECONDS
+                raise
+        with self._lock:
+            self._idle.append(conn)
+        return reply
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.command("GET", key)
+        except (OSError, SharedCacheError):
             return None
-        return response.json()
-    except requests.RequestException:
+
+    def set(self, key: str, value: bytes, ttl: float, only_new: bool = False) -> bool:
+        args: Tuple[Any, ...] = ("SET", key, value, "PX", max(1, int(ttl * 1000)))
+        try:
+            return self.command(*args, *(("NX",) if only_new else ())) == "OK"
+        except (OSError, SharedCacheError):
+            # An unreachable server must not leave every session waiting on a
+            # lock nobody holds, so callers go ahead as if they owned it.
+            return True
+
+    def delete(self, key: str) -> None:
+        try:
+            self.command("DEL", key)
+        except (OSError, SharedCacheError):
+            pass
+
+
+@st.cache_resource(show_spinner=False)
+def get_shared_cache() -> Optional[RedisCache]:
+    if SHARED_CACHE_URL.startswith(("redis://", "rediss://")):
+        return RedisCache(SHARED_CACHE_URL)
+    return None
+
+
+def shared_lookup(cache: RedisCache, key: str, ttl: int) -> Optional[Tuple[Any, float]]:
+    blob = cache.get(f"radar:{key}")
+    if blob is None:
+        return None
+    try:
+        entry = json.loads(zlib.decompress(blob))
+    except (zlib.error, ValueError):
+        return None
+    if time.time() - entry["stored_at"] >= ttl:
         return None
+    return entry["value"], entry["stored_at"]
+
+
+def shared_fetch(key: str, source: str, ttl: int, loader: Callable[[], Optional[Any]]) -> Tuple[Optional[Any], float]:
+    cache = get_shared_cache()
+    if cache is None:
+        return loader(), time.time()
+    with span(source, "shared") as record:
+        entry = shared_lookup(cache, key, ttl)
+        if entry is not None:
+            record.cache = "hit"
+            return entry
+        # Whoever takes the lock loads from upstream; everyone else polls for
+        # its result and only loads itself if the owner does not deliver.
+        lock = f"radar:lock:{key}"
+        owner = cache.set(lock, b"1", SHARED_LOCK_SECONDS, only_new=True)
+        if not owner:
+            record.cache = "wait"
+            deadline = time.monotonic() + SHARED_WAIT_SECONDS
+            while time.monotonic() < deadline:
+                time.sleep(SHARED_POLL_SECONDS)
+                entry = shared_lookup(cache, key, ttl)
+                if entry is not None:
+                    record.cache = "coalesced"
+                    return entry
+                owner = cache.set(lock, b"1", SHARED_LOCK_SECONDS, only_new=True)
+                if owner:
+                    break
+        record.cache = "miss"
+        try:
+            value = loader()
+        finally:
+            if owner:
+                cache.delete(lock)
+        stored_at = time.time()
+        if value is not None:
+            blob = zlib.compress(json.dumps({"stored_at": stored_at, "value": value}).encode("utf-8"))
+            cache.set(f"radar:{key}", blob, ttl)
+        return value, stored_at
+
+
+_REFRESHING: set = set()
+_REFRESHING_LOCK = threading.Lock()
+
+
+def cache_key(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def source_ttl(url: str) -> int:
+    return SOURCE_TTLS.get(urlsplit(url).netloc, DEFAULT_SOURCE_TTL)
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        if not leader:
+            try:
+                return call.result(), False
+            except CancelledError:
+                return self.do(key, fn)
+        try:
+            call.set_result(fn())
+        except Exception as exc:
+            call.set_exception(exc)
+        finally:
+            with self._lock:
+                del self._calls[key]
+            # A leader stopped by a rerun hands the request to one of its followers.
+            call.cancel()
+        return call.result(), True
+
+
+@st.cache_resource(show_spinner=False)
+def get_single_flight() -> SingleFlight:
+    return SingleFlight()
+
+
+def load_entry(key: str, source: str, ttl: int, loader: Callable[[], Optional[Any]]) -> Optional[Any]:
+    value, stored_at = shared_fetch(key, source, ttl, loader)
+    cache = get_disk_cache()
+    if value is not None and cache is not None:
+        cache.set(key, source, value, stored_at)
+    return value
+
+
+def cached_fetch(key: str, source: str, ttl: int, loader: Callable[[], Optional[Any]]) -> Optional[Any]:
+    with span(source, "disk") as record:
+        cache = get_disk_cache()
+        if cache is not None:
+            entry = cache.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = time.time() - stored_at
+                if age < ttl:
+                    record.cache = "hit"
+                    return value
+                if age < ttl + CACHE_STALE_SECONDS:
+                    record.cache = "stale"
+                    refresh_in_background(key, source, ttl, loader)
+                    return value
+        # st.cache_data already serialises identical calls to one function; this
+        # also joins different fetchers, background refreshes and the warm-up
+        # worker that end up on the same request in this process.
+        value, leader = get_single_flight().do(key, lambda: load_entry(key, source, ttl, loader))
+        record.cache = ("miss" if cache is not None else "off") if leader else "joined"
+        return value
+
+
+def refresh_in_background(key: str, source: str, ttl: int, loader: Callable[[], Optional[Any]]) -> None:
+    with _REFRESHING_LOCK:
+        if key in _REFRESHING:
+            return
+        _REFRESHING.add(key)
+
+    def refresh() -> None:
+        try:
+            get_single_flight().do(key, lambda: load_entry(key, source, ttl, loader))
+        except FetchError:
+            pass
+        finally:
+            with _REFRESHING_LOCK:
+                _REFRESHING.discard(key)
+
+    get_fetch_scheduler().submit(refresh)
+
+
+def t(lang: str, key: str) -> str:
+    return I18N.get(lang, I18N["en"]).get(key, key)
+
+
+def fetch_json(url: str, params: Optional[Dict[str, str]] = None) -> Optional[dict]:
+    host = urlsplit(url).netloc
+    key = cache_key("GET", url, params)
+    return cached_fetch(key, host, source_ttl(url), lambda: request_json(url, params))
+
+
+def request_json(url: str, params: Optional[Dict[str, str]] = None) -> dict:
+    with span(urlsplit(url).netloc, "http") as record:
+        try:
+            with host_slot(url):
+                response = get_http_session().get(url, params=params, timeout=30)
+            observe_response(record, response)
+            if response.status_code != 200:
+                raise FetchError(f"{url} returned HTTP {response.status_code}")
+            return response.json()
+        except requests.RequestException as exc:
+            raise FetchError(str(exc)) from exc
 
 
-@st.cache_data(show_spinner=False, ttl=86400)
+@fallback([])
+@cache_data(ttl=86400)
 def fetch_countries() -> List[Tuple[str, str, str]]:
+    if SNAPSHOT_OFFLINE:
+        return get_snapshot_store().countries()
     data = fetch_json(f"{WB_BASE}/country", params={"format": "json", "per_page": "400"})
     if not data or len(data) < 2:
         return []
@@ -493,72 +1393,273 @@ def fetch_countries() -> List[Tuple[str, str, str]]:
     return sorted(countries, key=lambda x: x[2])
 
 
-@st.cache_data(show_spinner=False, ttl=86400)
-def fetch_indicator(country_code: str, indicator: str) -> Tuple[Optional[float], Optional[int]]:
-    url = f"{WB_BASE}/country/{country_code}/indicator/{indicator}"
-    data = fetch_json(url, params={"format": "json", "per_page": "10"})
-    if not data or len(data) < 2:
-        return None, None
-    for row in data[1]:
-        if row.get("value") is not None:
-            return row.get("value"), row.get("date")
-    return None, None
-
-
-@st.cache_data(show_spinner=False, ttl=86400)
-def fetch_wgi_risk(country_code: str) -> Tuple[Optional[float], Optional[int]]:
-    indicators = ["CC.EST", "GE.EST", "PV.EST", "RL.EST", "RQ.EST", "VA.EST"]
-    values = []
+def wgi_average(
+    values: Dict[str, Tuple[Optional[float], Optional[int]]]
+) -> Tuple[Optional[float], Optional[int]]:
+    scores = []
     years = []
-    for indicator in indicators:
-        value, year = fetch_indicator(country_code, indicator)
+    for indicator in WGI_INDICATORS:
+        value, year = values.get(indicator, (None, None))
         if value is not None:
-            values.append(value)
+            scores.append(value)
         if year is not None:
             years.append(year)
-    if not values:
+    if not scores:
         return None, None
-    avg = sum(values) / len(values)
+    avg = sum(scores) / len(scores)
     year = max(years) if years else None
     return avg, year
 
 
-@st.cache_data(show_spinner=False, ttl=86400)
-def fetch_worldcities(country_code: str) -> List[CityRecord]:
-    params = {
-        "dataset": "geonames-all-cities-with-a-population-1000",
-        "rows": "500",
-        "sort": "population",
-        "refine.country_code": country_code.upper(),
+def iter_wb_rows(
+    country_codes: Optional[Tuple[str, ...]],
+    indicators: Tuple[str, ...],
+    years: Optional[Tuple[int, int]] = None,
+    per_page: int = 1000,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Iterator[Tuple[str, str, dict]]:
+    # Yields (country code as passed in, indicator, row). country_codes=None asks
+    # for every country; without years each series gives its latest value.
+    by_source: Dict[str, List[str]] = {}
+    for indicator in dict.fromkeys(indicators):
+        by_source.setdefault(INDICATOR_SOURCES.get(indicator, WDI_SOURCE), []).append(indicator)
+    if country_codes is None:
+        chunks: List[Optional[Tuple[str, ...]]] = [None]
+    else:
+        chunks = [
+            country_codes[start : start + WB_BATCH_COUNTRIES]
+            for start in range(0, len(country_codes), WB_BATCH_COUNTRIES)
+        ]
+    for chunk in chunks:
+        lookup = {code.upper(): code for code in chunk or ()}
+        countries = "all" if chunk is None else ";".join(chunk)
+        for source, source_indicators in by_source.items():
+            url = f"{WB_BASE}/country/{countries}/indicator/{';'.join(source_indicators)}"
+            params = {"format": "json", "source": source, "per_page": str(per_page)}
+            if years is None:
+                params["mrnev"] = "1"
+            else:
+                params["date"] = f"{years[0]}:{years[1]}"
+            page = 1
+            pages = 1
+            while page <= pages:
+                data = fetch_json(url, params={**params, "page": str(page)})
+                if not data or len(data) < 2 or not data[1]:
+                    break
+                pages = int(data[0].get("pages") or 1)
+                for row in data[1]:
+                    indicator = row.get("indicator", {}).get("id")
+                    if indicator not in source_indicators:
+                        continue
+                    iso3 = (row.get("countryiso3code") or "").upper()
+                    if chunk is None:
+                        code = iso3
+                    else:
+                        code = lookup.get(iso3) or lookup.get(row.get("country", {}).get("id") or "")
+                    if code:
+                        yield code, indicator, row
+                if progress:
+                    progress(page, pages)
+                page += 1
+
+
+@fallback({})
+@cache_data(ttl=86400)
+def fetch_indicator_batch(
+    country_codes: Tuple[str, ...], indicators: Tuple[str, ...]
+) -> Dict[str, Dict[str, Tuple[Optional[float], Optional[int]]]]:
+    if SNAPSHOT_OFFLINE:
+        return get_snapshot_store().latest_values(country_codes, indicators)
+    results: Dict[str, Dict[str, Tuple[Optional[float], Optional[int]]]] = {
+        code: {} for code in country_codes
     }
-    data = fetch_json(ODS_BASE, params=params)
-    if not data or "records" not in data:
-        return []
-    cities = []
-    for record in data["records"]:
-        fields = record.get("fields", {})
-        pop = fields.get("population")
+    for code, indicator, row in iter_wb_rows(country_codes, indicators):
+        if row.get("value") is not None:
+            results[code].setdefault(indicator, (row.get("value"), row.get("date")))
+    return results
+
+
+def empty_country_indicators() -> Dict[str, Tuple[Optional[float], Optional[int]]]:
+    row = {key: (None, None) for key in COUNTRY_INDICATORS}
+    row["risk_score"] = (None, None)
+    return row
+
+
+@fallback({})
+@cache_data(ttl=86400)
+def fetch_country_indicators(
+    country_codes: Tuple[str, ...]
+) -> Dict[str, Dict[str, Tuple[Optional[float], Optional[int]]]]:
+    batch = fetch_indicator_batch.strict(country_codes, tuple(COUNTRY_INDICATORS.values()) + WGI_INDICATORS)
+    indicators = {}
+    for code in country_codes:
+        values = batch.get(code, {})
+        row = {key: values.get(indicator, (None, None)) for key, indicator in COUNTRY_INDICATORS.items()}
+        row["risk_score"] = wgi_average(values)
+        indicators[code] = row
+    return indicators
+
+
+@fallback(CityStore.empty())
+@cache_data(ttl=86400)
+def fetch_worldcities(country_code: str) -> CityStore:
+    # The first page of the CityLoader, so warming this warms the page's first fetch.
+    return next(iter_worldcities(country_code), CityStore.empty())
+
+
+def iter_worldcities(country_code: str, page_size: int = CITY_PAGE_SIZE) -> Iterator[CityStore]:
+    if SNAPSHOT_OFFLINE:
+        cities = get_snapshot_store().cities(country_code)
+        for start in range(0, len(cities), page_size):
+            yield cities[start : start + page_size]
+        return
+    floor = None
+    skip_ids: set = set()
+    while True:
+        window_min = None
+        ids_at_min: set = set()
+        for start in range(0, ODS_MAX_WINDOW, page_size):
+            rows = min(page_size, ODS_MAX_WINDOW - start)
+            params = {
+                "dataset": CITIES_DATASET,
+                "rows": str(rows),
+                "start": str(start),
+                "sort": "population",
+                "refine.country_code": country_code.upper(),
+            }
+            if floor is not None:
+                params["q"] = f"population<={floor}"
+            data = fetch_json(ODS_BASE, params=params)
+            records = (data or {}).get("records") or []
+            page = []
+            for record in records:
+                record_id = record.get("recordid")
+                if record_id in skip_ids:
+                    continue
+                city = parse_city_record(record)
+                page.append(city)
+                if city.population is None:
+                    continue
+                if window_min is None or city.population < window_min:
+                    window_min = city.population
+                    ids_at_min = set()
+                if city.population == window_min:
+                    ids_at_min.add(record_id)
+            if page:
+                yield CityStore.from_records(page)
+            if len(records) < rows:
+                return
+        # The search window is exhausted: continue below the smallest population
+        # seen so far, skipping the boundary records already yielded.
+        if window_min is None or window_min == floor:
+            return
+        floor = window_min
+        skip_ids = ids_at_min
+
+
+def load_worldcities(country_code: str, limit: int = CITY_LOAD_LIMIT) -> CityStore:
+    pages: List[CityStore] = []
+    loaded = 0
+    for page in iter_worldcities(country_code):
+        pages.append(page)
+        loaded += len(page)
+        if loaded >= limit:
+            break
+    return CityStore.concat(pages)[:limit]
+
+
+class CityLoader:
+    def __init__(self, country_code: str) -> None:
+        self.country_code = country_code
+        self.done = False
+        self.error: Optional[FetchError] = None
+        self.finished_at = 0.0
+        self._pages: List[CityStore] = []
+        self._loaded = 0
+        self._lock = threading.Lock()
+        self._first_page = threading.Event()
+        # Paging runs on its own thread; only the page fetches themselves take a
+        # scheduler worker, so a long load never holds one for its whole length.
+        start_daemon(self._run, f"cities-{country_code}")
+
+    def _run(self) -> None:
+        scheduler = get_fetch_scheduler()
+        pages = iter_worldcities(self.country_code)
         try:
-            pop = int(pop) if pop else None
-        except (TypeError, ValueError):
-            pop = None
-        coords = fields.get("coordinates") or []
-        lat = coords[0] if len(coords) >= 2 else None
-        lon = coords[1] if len(coords) >= 2 else None
-        cities.append(
-            CityRecord(
-                name=fields.get("name") or fields.get("ascii_name") or "",
-                country=fields.get("cou_name_en") or "",
-                population=pop,
-                lat=lat,
-                lon=lon,
-            )
-        )
-    return cities
+            while True:
+                page = scheduler.submit(next, pages, None).result()
+                if page is None:
+                    break
+                with self._lock:
+                    self._pages.append(page)
+                    self._loaded += len(page)
+                    loaded = self._loaded
+                self._first_page.set()
+                if loaded >= CITY_LOAD_LIMIT:
+                    break
+        except FetchError as exc:
+            self.error = exc
+        finally:
+            pages.close()
+            self.finished_at = time.time()
+            self.done = True
+            self._first_page.set()
+
+    def cities(self) -> CityStore:
+        self._first_page.wait()
+        with self._lock:
+            # Pages are joined when read, not as they arrive, and the result
+            # replaces them so the next read only appends what came since.
+            cities = CityStore.concat(self._pages)
+            self._pages = [cities] if len(cities) else []
+            return cities
+
+    def loaded(self) -> int:
+        with self._lock:
+            return self._loaded
+
 
+@st.cache_resource(show_spinner=False, ttl=86400)
+def get_city_loader(country_code: str) -> CityLoader:
+    return CityLoader(country_code)
 
-@st.cache_data(show_spinner=False, ttl=86400)
+
+def session_city_loader(country_code: str) -> CityLoader:
+    # A failed load stays with the session until it is retried, so reruns do
+    # not start the same failing load over and over.
+    if "failed_city_loaders" not in st.session_state:
+        st.session_state.failed_city_loaders = {}
+    loader = st.session_state.failed_city_loaders.get(country_code)
+    if loader is not None and time.time() - loader.finished_at < CITY_RETRY_SECONDS:
+        return loader
+    st.session_state.failed_city_loaders.pop(country_code, None)
+    return get_city_loader(country_code)
+
+
+def parse_city_record(record: dict) -> CityRecord:
+    fields = record.get("fields", {})
+    pop = fields.get("population")
+    try:
+        pop = int(pop) if pop else None
+    except (TypeError, ValueError):
+        pop = None
+    coords = fields.get("coordinates") or []
+    lat = coords[0] if len(coords) >= 2 else None
+    lon = coords[1] if len(coords) >= 2 else None
+    return CityRecord(
+        name=fields.get("name") or fields.get("ascii_name") or "",
+        country=fields.get("cou_name_en") or "",
+        population=pop,
+        lat=lat,
+        lon=lon,
+    )
+
+
+@fallback(None)
+@cache_data(ttl=86400)
 def fetch_city_cost_m2(city: str, country: str) -> Optional[float]:
+    if SNAPSHOT_OFFLINE:
+        return get_snapshot_store().city_cost(city, country)
     params = {
         "dataset": "numbeo",
         "q": f"{city} {country}",
@@ -567,11 +1668,11 @@ def fetch_city_cost_m2(city: str, country: str) -> Optional[float]:
     data = fetch_json(ODS_BASE, params=params)
     if not data or "records" not in data or not data["records"]:
         return None
-    fields = data["records"][0].get("fields", {})
-    for key in (
-        "price_to_buy_apartment_city_centre_usd",
-        "price_to_buy_apartment_city_centre",
-    ):
+    return parse_cost(data["records"][0].get("fields", {}))
+
+
+def parse_cost(fields: dict) -> Optional[float]:
+    for key in COST_FIELDS:
         value = fields.get(key)
         if value:
             try:
@@ -581,123 +1682,393 @@ def fetch_city_cost_m2(city: str, country: str) -> Optional[float]:
     return None
 
 
-@st.cache_data(show_spinner=False, ttl=86400)
+@fallback(None)
+@cache_data(ttl=86400)
 def fetch_city_rent(city: str, country: str) -> Optional[float]:
     # No global public dataset for city-level rent in OpenDataSoft at the moment.
     # Keep placeholder for future data sources.
     return None
 
 
-def overpass_query(query: str) -> Optional[dict]:
-    try:
-        response = requests.post(OVERPASS_URL, data={"data": query}, timeout=60)
-        if response.status_code != 200:
-            return None
-        return response.json()
-    except requests.RequestException:
-        return None
+def overpass_query(query: str, timeout: int = 60, fields: Optional[Tuple[str, ...]] = None) -> Optional[dict]:
+    parse = functools.partial(parse_overpass_json, fields=fields)
+    return run_overpass(query, timeout, parse, (fields,) if fields else ())
 
 
-@st.cache_data(show_spinner=False, ttl=3600)
-def fetch_city_zones(city: str, country_code: str, lat: Optional[float], lon: Optional[float]) -> List[str]:
-    if lat is not None and lon is not None:
-        area_filter = f"(around:15000,{lat},{lon})"
-    else:
-        area_filter = f'(area["name"="{city}"]["boundary"="administrative"]["ISO3166-1"="{country_code}"])'
-    query = textwrap.dedent(
-        f"""
-        [out:json][timeout:25];
-        (
-          node["place"~"neighbourhood|suburb"]{area_filter};
-          way["place"~"neighbourhood|suburb"]{area_filter};
-          relation["place"~"neighbourhood|suburb"]{area_filter};
-        );
-        out tags;
-        """
-    ).strip()
-    data = overpass_query(query)
-    if not data or "elements" not in data:
-        return []
-    zones = []
-    for element in data["elements"]:
-        tags = element.get("tags", {})
-        name = tags.get("name")
-        if name:
-            zones.append(name)
-    return sorted(set(zones))
+def overpass_table(query: str, timeout: int = 60) -> Optional[List[List[str]]]:
+    return run_overpass(query, timeout, parse_overpass_csv)
 
 
-@st.cache_data(show_spinner=False, ttl=3600)
-def fetch_malls_offices(city: str, country_code: str, lat: Optional[float], lon: Optional[float]) -> List[str]:
-    if lat is not None and lon is not None:
-        area_filter = f"(around:15000,{lat},{lon})"
+def run_overpass(
+    query: str, timeout: int, parse: Callable[[requests.Response], Any], variant: Tuple[Any, ...] = ()
+) -> Optional[Any]:
+    if SNAPSHOT_OFFLINE:
+        raise FetchError("Overpass is not available in offline snapshot mode")
+    key = cache_key("POST", OVERPASS_URL, query, *variant)
+    host = urlsplit(OVERPASS_URL).netloc
+    return cached_fetch(
+        key, host, source_ttl(OVERPASS_URL), lambda: get_overpass_client().query(query, timeout, parse)
+    )
+
+
+_JSON_SPACE = re.compile(r"[\s,]*")
+
+
+def parse_overpass_json(response: requests.Response, fields: Optional[Tuple[str, ...]] = None) -> dict:
+    # Decodes the elements array one element at a time from the stream, keeping
+    # only the requested fields.
+    response.encoding = response.encoding or "utf-8"
+    chunks = response.iter_content(OVERPASS_CHUNK_BYTES, decode_unicode=True)
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        start = buffer.find('"elements"')
+        bracket = buffer.find("[", start) if start >= 0 else -1
+        if bracket >= 0:
+            break
     else:
-        area_filter = f'(area["name"="{city}"]["boundary"="administrative"]["ISO3166-1"="{country_code}"])'
-    query = textwrap.dedent(
-        f"""
-        [out:json][timeout:25];
-        (
-          node["shop"="mall"]{area_filter};
-          way["shop"="mall"]{area_filter};
-          relation["shop"="mall"]{area_filter};
-          node["building"="office"]{area_filter};
-          way["building"="office"]{area_filter};
-          relation["building"="office"]{area_filter};
-          node["office"]{area_filter};
-        );
-        out tags;
-        """
-    ).strip()
-    data = overpass_query(query)
-    if not data or "elements" not in data:
-        return []
-    pois = []
-    for element in data["elements"]:
-        tags = element.get("tags", {})
-        name = tags.get("name")
-        if name:
-            pois.append(name)
-    return sorted(set(pois))
+        return check_overpass_remark(json.loads(buffer or "{}"))
+    data = json.loads(buffer[:start].rstrip().rstrip(",") + "}")
+    elements = data["elements"] = []
+    decoder = json.JSONDecoder()
+    buffer = buffer[bracket + 1 :]
+    pos = 0
+    while True:
+        pos = _JSON_SPACE.match(buffer, pos).end()
+        if buffer.startswith("]", pos):
+            tail = (buffer[pos + 1 :] + "".join(chunks)).strip().lstrip(",")
+            data.update(json.loads("{" + tail))
+            return check_overpass_remark(data)
+        try:
+            element, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise ValueError("Overpass response ended inside the elements array")
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        if fields is not None:
+            element = {key: element[key] for key in fields if key in element}
+        elements.append(element)
 
 
-@st.cache_data(show_spinner=False, ttl=3600)
-def fetch_competitors(
-    city: str,
-    country_code: str,
-    category: str,
-    lat: Optional[float],
-    lon: Optional[float],
-    radius_m: int,
-) -> int:
-    osm_tag = BUSINESS_OSM_MAP.get(category)
-    if osm_tag:
-        key, value = osm_tag
-        filter_part = f'["{key}"="{value}"]'
-    else:
-        keyword = category.split()[0]
-        filter_part = f'["name"~"{keyword}",i]'
+def check_overpass_remark(data: dict) -> dict:
+    # Overpass reports timeouts and memory exhaustion with HTTP 200 and a
+    # remark; the elements are then incomplete, not an empty result.
+    remark = data.get("remark") or ""
+    if "runtime error" in remark:
+        raise ValueError(remark)
+    return data
+
+
+def parse_overpass_csv(response: requests.Response) -> List[List[str]]:
+    response.encoding = response.encoding or "utf-8"
+    rows = [line.split("\t") for line in response.iter_lines(decode_unicode=True) if line]
+    # CSV output carries no remark, so a query that times out or runs out of
+    # memory just stops early. CSV queries end with "out count;" into a last
+    # ::count column; without that row the table is incomplete, not empty.
+    if not rows or not rows[-1][-1].isdigit():
+        raise OverpassQueryError(f"Overpass CSV output ended without its count row ({len(rows)} rows)")
+    return [row[:-1] for row in rows[:-1]]
+
+
+@st.cache_resource(show_spinner=False)
+def get_overpass_session() -> requests.Session:
+    # Throttling answers are handled by OverpassClient, which backs off and fails
+    # over to another endpoint instead of retrying the same one in place.
+    adapter = HTTPAdapter(
+        pool_connections=len(OVERPASS_URLS),
+        pool_maxsize=FETCH_WORKERS,
+        max_retries=Retry(total=1, connect=1, read=0, status=0, other=0),
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self) -> float:
+        with self._lock:
+            self._refill()
+            return max(0.0, (1 - self._tokens) / self.rate)
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        with self._lock:
+            self._refill()
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            # Tokens may go negative: later callers queue behind this reservation.
+            self._tokens -= 1
+            return wait
+
+
+def parse_overpass_status(text: str) -> Tuple[Optional[int], Optional[int], Optional[float]]:
+    limit = available = wait = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("Rate limit:"):
+            limit = int(line.split(":", 1)[1])
+        elif line.endswith("slots available now."):
+            available = int(line.split()[0])
+        elif line.startswith("Slot available after:") and " in " in line:
+            seconds = float(line.rsplit(" in ", 1)[1].split()[0])
+            wait = seconds if wait is None else min(wait, seconds)
+    return limit, available, wait
+
+
+class OverpassQueryError(FetchError):
+    pass
+
+
+class OverpassEndpoint:
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.host = urlsplit(url).netloc
+        self.status_url = url.rsplit("/", 1)[0] + "/status"
+        self.bucket = TokenBucket(OVERPASS_MAX_RATE, 2)
+        self.blocked_until = 0.0
+        self.failures = 0
+        self.unlimited = False
+        self._status_checked = 0.0
+        self._lock = threading.Lock()
+
+    def ready_in(self) -> float:
+        delay = 0.0 if self.unlimited else self.bucket.delay()
+        return max(self.blocked_until - time.time(), delay, 0.0)
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        blocked = max(0.0, self.blocked_until - time.time())
+        if blocked > max_wait:
+            return None
+        if self.unlimited:
+            return blocked
+        wait = self.bucket.reserve(max_wait - blocked)
+        return None if wait is None else blocked + wait
+
+    def refresh_status(self, force: bool = False) -> None:
+        with self._lock:
+            if not force and time.time() - self._status_checked < OVERPASS_STATUS_TTL:
+                return
+            self._status_checked = time.time()
+        try:
+            with span(self.host, "status") as record:
+                response = get_overpass_session().get(self.status_url, timeout=5)
+                observe_response(record, response)
+            if response.status_code != 200:
+                return
+            limit, available, wait = parse_overpass_status(response.text)
+        except (requests.RequestException, ValueError):
+            # Local instances often run without the status endpoint.
+            return
+        # A rate limit of 0 is how self-hosted instances advertise "no limit".
+        self.unlimited = limit == 0
+        if limit:
+            self.bucket.capacity = limit
+        if available == 0 and wait is not None:
+            self.blocked_until = max(self.blocked_until, time.time() + wait)
+
+    def backoff(self, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            self.failures += 1
+            cooldown = min(OVERPASS_COOLDOWN_SECONDS * 2 ** (self.failures - 1), OVERPASS_MAX_COOLDOWN_SECONDS)
+            self.blocked_until = time.time() + (retry_after if retry_after is not None else cooldown)
+
+    def throttled(self, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            self.bucket.rate = max(OVERPASS_MIN_RATE, self.bucket.rate / 2)
+        self.backoff(retry_after)
+        self.refresh_status(force=True)
+
+    def succeeded(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.bucket.rate = min(OVERPASS_MAX_RATE, self.bucket.rate + OVERPASS_MAX_RATE / 10)
+
+    def post(self, query: str, timeout: int, parse: Callable[[requests.Response], Any]) -> Any:
+        response = None
+        with span(self.host, "http") as record:
+            try:
+                with host_slot(self.url):
+                    response = get_overpass_session().post(
+                        self.url, data={"data": query}, timeout=timeout, stream=True
+                    )
+                    observe_response(record, response, body=False)
+                    retry_after = response.headers.get("Retry-After", "")
+                    retry_after = float(retry_after) if retry_after.isdigit() else None
+                    if response.status_code in (429, 504):
+                        self.throttled(retry_after)
+                        raise FetchError(f"{self.url} returned HTTP {response.status_code}")
+                    if 400 <= response.status_code < 500:
+                        # The query itself was rejected; another endpoint will reject it too.
+                        raise OverpassQueryError(f"{self.url} returned HTTP {response.status_code}")
+                    if response.status_code == 503:
+                        self.backoff(retry_after)
+                    if response.status_code != 200:
+                        raise FetchError(f"{self.url} returned HTTP {response.status_code}")
+                    try:
+                        data = parse(response)
+                    except ValueError as exc:
+                        if any(remark in str(exc) for remark in OVERPASS_RATE_REMARKS):
+                            self.throttled()
+                        raise FetchError(f"{self.url}: unusable response ({exc})") from exc
+                    record.bytes = response.raw.tell()
+            except requests.RequestException as exc:
+                self.backoff()
+                raise FetchError(f"{self.url}: {exc}") from exc
+            finally:
+                if response is not None:
+                    response.close()
+        self.succeeded()
+        return data
+
+
+class OverpassClient:
+    def __init__(self, urls: Tuple[str, ...]) -> None:
+        self.endpoints = [OverpassEndpoint(url) for url in urls]
+
+    def pick(self) -> OverpassEndpoint:
+        checked = set()
+        while True:
+            # min() keeps the configured order among endpoints that are ready now;
+            # a fresh status may show the pick is out of slots, so pick again.
+            endpoint = min(self.endpoints, key=lambda candidate: candidate.ready_in())
+            if endpoint.url in checked:
+                return endpoint
+            endpoint.refresh_status()
+            checked.add(endpoint.url)
+
+    def query(
+        self, query: str, timeout: int = 60, parse: Callable[[requests.Response], Any] = parse_overpass_json
+    ) -> Any:
+        errors = []
+        for _ in range(OVERPASS_ATTEMPTS):
+            endpoint = self.pick()
+            wait = endpoint.reserve(OVERPASS_MAX_WAIT_SECONDS)
+            if wait is None:
+                errors.append(f"{endpoint.host} is rate limited")
+                break
+            if wait:
+                time.sleep(wait)
+            try:
+                return endpoint.post(query, timeout, parse)
+            except OverpassQueryError:
+                raise
+            except FetchError as exc:
+                errors.append(str(exc))
+        raise FetchError("; ".join(errors) or "no Overpass endpoint configured")
+
+
+@st.cache_resource(show_spinner=False)
+def get_overpass_client() -> OverpassClient:
+    return OverpassClient(OVERPASS_URLS)
+
+
+@fallback(None)
+@cache_data(ttl=3600)
+def fetch_city_zones(city: str, country_code: str, lat: Optional[float], lon: Optional[float]) -> List[str]:
     if lat is not None and lon is not None:
-        area_filter = f"(around:{radius_m},{lat},{lon})"
-    else:
-        area_filter = f'(area["name"="{city}"]["boundary"="administrative"]["ISO3166-1"="{country_code}"])'
+        index = get_poi_index(city, country_code, lat, lon)
+        kinds = tuple(f"place:{zone_type}" for zone_type in ZONE_NAME_TYPES)
+        return index.names(kinds, AREA_NAMES_RADIUS_M, OVERPASS_NAME_LIMIT)
+    area_filter = f'(area["name"="{city}"]["boundary"="administrative"]["ISO3166-1"="{country_code}"])'
+    query = textwrap.dedent(
+        f"""
+        [out:csv(name, ::count; false)][timeout:25];
+        (
+          nwr["place"~"neighbourhood|suburb"]["name"]{area_filter};
+        );
+        out tags qt {OVERPASS_NAME_LIMIT};
+        out count;
+        """
+    ).strip()
+    return names_from_rows(overpass_table(query))
+
+
+@fallback(None)
+@cache_data(ttl=3600)
+def fetch_malls_offices(city: str, country_code: str, lat: Optional[float], lon: Optional[float]) -> List[str]:
+    if lat is not None and lon is not None:
+        index = get_poi_index(city, country_code, lat, lon)
+        return index.names(MALL_OFFICE_KINDS, AREA_NAMES_RADIUS_M, OVERPASS_NAME_LIMIT)
+    area_filter = f'(area["name"="{city}"]["boundary"="administrative"]["ISO3166-1"="{country_code}"])'
     query = textwrap.dedent(
         f"""
-        [out:json][timeout:25];
+        [out:csv(name, ::count; false)][timeout:25];
         (
-          node{filter_part}{area_filter};
-          way{filter_part}{area_filter};
-          relation{filter_part}{area_filter};
+          nwr["shop"="mall"]["name"]{area_filter};
+          nwr["building"="office"]["name"]{area_filter};
+          nwr["office"]["name"]{area_filter};
         );
+        out tags qt {OVERPASS_NAME_LIMIT};
         out count;
         """
     ).strip()
-    data = overpass_query(query)
+    return names_from_rows(overpass_table(query))
+
+
+@fallback(None)
+@cache_data(ttl=3600)
+def fetch_competitors(
+    city: str,
+    country_code: str,
+    category: str,
+    lat: Optional[float],
+    lon: Optional[float],
+    radius_m: int,
+) -> int:
+    counts = fetch_competitor_counts.strict(city, country_code, (category,), lat, lon, radius_m)
+    return counts.get(category, 0)
+
+
+@fallback(None)
+@cache_data(ttl=3600)
+def fetch_competitor_counts(
+    city: str,
+    country_code: str,
+    categories: Tuple[str, ...],
+    lat: Optional[float],
+    lon: Optional[float],
+    radius_m: int,
+) -> Dict[str, int]:
+    if poi_index_covers(categories, lat, lon, radius_m):
+        index = get_poi_index(city, country_code, lat, lon)
+        return {category: index.count(category, radius_m) for category in categories}
+    area_filter = build_area_filter(city, country_code, lat, lon, radius_m)
+    statements = []
+    for idx, category in enumerate(categories):
+        filter_part = category_filter(category)
+        statements.append(
+            f"(node{filter_part}{area_filter}; way{filter_part}{area_filter}; "
+            f"relation{filter_part}{area_filter};)->.c{idx};\n.c{idx} out count;"
+        )
+    query = "[out:json][timeout:55];\n" + "\n".join(statements)
+    counts = {category: 0 for category in categories}
+    data = overpass_query(query, fields=("type", "tags"))
     if not data or "elements" not in data:
-        return 0
-    for element in data["elements"]:
-        if element.get("type") == "count":
-            return int(element.get("tags", {}).get("total", 0))
-    return 0
+        return counts
+    totals = [
+        int(element.get("tags", {}).get("total", 0))
+        for element in data["elements"]
+        if element.get("type") == "count"
+    ]
+    for category, total in zip(categories, totals):
+        counts[category] = total
+    return counts
 
 
 def build_area_filter(
@@ -708,23 +2079,202 @@ def build_area_filter(
     return f'(area["name"="{city}"]["boundary"="administrative"]["ISO3166-1"="{country_code}"])'
 
 
-def extract_points(elements: List[dict], limit: int) -> List[dict]:
+def category_filter(category: str) -> str:
+    osm_tag = BUSINESS_OSM_MAP.get(category)
+    if osm_tag:
+        key, value = osm_tag
+        return f'["{key}"="{value}"]'
+    keyword = category.split()[0]
+    return f'["name"~"{keyword}",i]'
+
+
+def names_from_rows(rows: Optional[List[List[str]]]) -> List[str]:
+    return sorted({row[0] for row in rows or [] if row and row[0]})
+
+
+def points_from_rows(rows: Optional[List[List[str]]], limit: int) -> List[dict]:
     points = []
-    for element in elements:
-        tags = element.get("tags", {})
-        name = tags.get("name")
-        if "lat" in element and "lon" in element:
-            points.append({"lat": element["lat"], "lon": element["lon"], "name": name})
-        elif "center" in element:
-            center = element.get("center", {})
-            if "lat" in center and "lon" in center:
-                points.append({"lat": center["lat"], "lon": center["lon"], "name": name})
+    for row in rows or []:
+        if len(row) < 2 or not row[0] or not row[1]:
+            continue
+        try:
+            lat, lon = float(row[0]), float(row[1])
+        except ValueError:
+            continue
+        points.append({"lat": lat, "lon": lon, "name": row[2] if len(row) > 2 and row[2] else None})
         if len(points) >= limit:
             break
     return points
 
 
-@st.cache_data(show_spinner=False, ttl=3600)
+def distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * 6_371_000 * math.asin(math.sqrt(min(a, 1.0)))
+
+
+REC_CANDIDATES = tuple(list(BUSINESS_OSM_MAP.keys())[:6])
+
+POI_TAG_KINDS: Dict[Tuple[str, str], List[str]] = {}
+for _category, _tag in BUSINESS_OSM_MAP.items():
+    POI_TAG_KINDS.setdefault(_tag, []).append(_category)
+for _zone_type in ZONE_TYPES:
+    POI_TAG_KINDS[("place", _zone_type)] = [f"place:{_zone_type}"]
+# "*" matches any value of the key, but only for named features.
+POI_TAG_KINDS.setdefault(("shop", "mall"), []).append("poi:mall")
+POI_TAG_KINDS.setdefault(("building", "office"), []).append("poi:office")
+POI_TAG_KINDS.setdefault(("office", "*"), []).append("poi:office")
+MALL_OFFICE_KINDS = ("poi:mall", "poi:office")
+
+
+def tag_statements(tags: Iterable[Tuple[str, str]], area_filter: str) -> Tuple[List[str], List[str]]:
+    values_by_key: Dict[str, List[str]] = {}
+    for key, value in tags:
+        values_by_key.setdefault(key, []).append(value)
+    keys = sorted(values_by_key)
+    statements = []
+    for key in keys:
+        values = [value for value in values_by_key[key] if value != "*"]
+        if values:
+            statements.append(f'  nwr["{key}"~"^({"|".join(values)})$"]{area_filter};')
+        if "*" in values_by_key[key]:
+            statements.append(f'  nwr["{key}"]["name"]{area_filter};')
+    return keys, statements
+
+
+def fetch_city_pois(lat: float, lon: float) -> List[dict]:
+    area_filter = f"(around:{POI_INDEX_RADIUS_M},{lat},{lon})"
+    keys, statements = tag_statements(POI_TAG_KINDS, area_filter)
+    columns = ", ".join(["::lat", "::lon", "name", *keys])
+    query = (
+        f"[out:csv({columns}, ::count; false)][timeout:{POI_INDEX_TIMEOUT}];\n(\n"
+        + "\n".join(statements)
+        + "\n);\nout center qt;\nout count;"
+    )
+    pois = []
+    for row in overpass_table(query, timeout=POI_INDEX_TIMEOUT) or []:
+        try:
+            lat_value, lon_value = float(row[0]), float(row[1])
+        except (IndexError, ValueError):
+            continue
+        name = row[2] if len(row) > 2 and row[2] else None
+        kinds = []
+        for key, value in zip(keys, row[3:]):
+            if not value:
+                continue
+            kinds.extend(POI_TAG_KINDS.get((key, value), []))
+            if name:
+                kinds.extend(POI_TAG_KINDS.get((key, "*"), []))
+        if kinds:
+            pois.append({"lat": lat_value, "lon": lon_value, "name": name, "kinds": kinds})
+    return pois
+
+
+def fetch_country_pois(country_code: str, categories: Tuple[str, ...]) -> Dict[str, np.ndarray]:
+    tags = {category: BUSINESS_OSM_MAP[category] for category in categories}
+    keys, statements = tag_statements(set(tags.values()), "(area.country)")
+    query = (
+        f"[out:csv(::lat, ::lon, {', '.join(keys)}, ::count; false)][timeout:{POI_MATRIX_TIMEOUT}];\n"
+        f'area["ISO3166-1"="{country_code.upper()}"]["admin_level"="2"]->.country;\n(\n'
+        + "\n".join(statements)
+        + "\n);\nout center qt;\nout count;"
+    )
+    rows = overpass_table(query, timeout=POI_MATRIX_TIMEOUT)
+    if rows is None:
+        raise FetchError(f"no POI extract for {country_code}")
+    points: Dict[Tuple[str, str], List[Tuple[float, float]]] = {}
+    for row in rows:
+        try:
+            lat, lon = float(row[0]), float(row[1])
+        except (IndexError, ValueError):
+            continue
+        for key, value in zip(keys, row[2:]):
+            if value:
+                points.setdefault((key, value), []).append((lat, lon))
+    return {
+        category: np.array(points.get(tag, []), dtype=float).reshape(-1, 2) for category, tag in tags.items()
+    }
+
+
+def count_within(lats: np.ndarray, lons: np.ndarray, points: np.ndarray, radius_m: float) -> np.ndarray:
+    counts = np.zeros(len(lats), dtype=np.int32)
+    if not len(points):
+        return counts
+    order = np.argsort(points[:, 0], kind="stable")
+    point_lats, point_lons = points[order, 0], points[order, 1]
+    # Only points inside the latitude band can be within the radius.
+    band = math.degrees(radius_m / 6_371_000)
+    for idx, (lat, lon) in enumerate(zip(lats, lons)):
+        if np.isnan(lat) or np.isnan(lon):
+            continue
+        lo, hi = np.searchsorted(point_lats, (lat - band, lat + band))
+        phi1, phi2 = np.radians(lat), np.radians(point_lats[lo:hi])
+        a = (
+            np.sin((phi2 - phi1) / 2) ** 2
+            + np.cos(phi1) * np.cos(phi2) * np.sin(np.radians(point_lons[lo:hi] - lon) / 2) ** 2
+        )
+        distances = 2 * 6_371_000 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        counts[idx] = np.count_nonzero(distances <= radius_m)
+    return counts
+
+
+class PoiIndex:
+    def __init__(self, lat: float, lon: float, pois: List[dict]) -> None:
+        rows: Dict[str, List[Tuple[float, dict]]] = {}
+        for poi in pois:
+            distance = distance_m(lat, lon, poi["lat"], poi["lon"])
+            point = {"lat": poi["lat"], "lon": poi["lon"], "name": poi["name"]}
+            for kind in poi["kinds"]:
+                rows.setdefault(kind, []).append((distance, point))
+        self._distances: Dict[str, List[float]] = {}
+        self._points: Dict[str, List[dict]] = {}
+        for kind, kind_rows in rows.items():
+            kind_rows.sort(key=lambda row: row[0])
+            self._distances[kind] = [distance for distance, _ in kind_rows]
+            self._points[kind] = [point for _, point in kind_rows]
+
+    def count(self, kind: str, radius_m: float) -> int:
+        return bisect.bisect_right(self._distances.get(kind, []), radius_m)
+
+    def points(self, kinds: List[str], radius_m: float, limit: int) -> List[dict]:
+        nearest = []
+        for kind in kinds:
+            within = self.count(kind, radius_m)
+            nearest.extend(zip(self._distances[kind][:within], self._points[kind][:within]) if within else [])
+        nearest.sort(key=lambda row: row[0])
+        return [dict(point) for _, point in nearest[:limit]]
+
+    def names(self, kinds: Tuple[str, ...], radius_m: float, limit: int) -> List[str]:
+        named = []
+        for kind in kinds:
+            within = self.count(kind, radius_m)
+            rows = zip(self._distances.get(kind, [])[:within], self._points.get(kind, [])[:within])
+            named.extend((distance, point["name"]) for distance, point in rows if point["name"])
+        named.sort(key=lambda row: row[0])
+        return sorted({name for _, name in named[:limit]})
+
+
+@st.cache_resource(show_spinner=False, ttl=3600)
+def get_poi_index(city: str, country_code: str, lat: float, lon: float) -> PoiIndex:
+    return PoiIndex(lat, lon, fetch_city_pois(lat, lon))
+
+
+def poi_index_covers(
+    categories: Tuple[str, ...], lat: Optional[float], lon: Optional[float], radius_m: int
+) -> bool:
+    return (
+        lat is not None
+        and lon is not None
+        and radius_m <= POI_INDEX_RADIUS_M
+        and all(category in BUSINESS_OSM_MAP for category in categories)
+    )
+
+
+@fallback(None)
+@cache_data(ttl=3600)
 def fetch_zone_points(
     city: str,
     country_code: str,
@@ -734,26 +2284,27 @@ def fetch_zone_points(
     limit: int,
     radius_m: int,
 ) -> List[dict]:
-    zone_filter = "|".join(zone_types) if zone_types else "neighbourhood|suburb|quarter|district"
+    if poi_index_covers((), lat, lon, radius_m):
+        index = get_poi_index(city, country_code, lat, lon)
+        kinds = [f"place:{zone_type}" for zone_type in (zone_types or ZONE_TYPES)]
+        return index.points(kinds, radius_m, limit)
+    zone_filter = "|".join(zone_types or ZONE_TYPES)
     area_filter = build_area_filter(city, country_code, lat, lon, radius_m)
     query = textwrap.dedent(
         f"""
-        [out:json][timeout:25];
+        [out:csv(::lat, ::lon, name, ::count; false)][timeout:25];
         (
-          node["place"~"{zone_filter}"]{area_filter};
-          way["place"~"{zone_filter}"]{area_filter};
-          relation["place"~"{zone_filter}"]{area_filter};
+          nwr["place"~"{zone_filter}"]{area_filter};
         );
-        out center;
+        out center qt {limit};
+        out count;
         """
     ).strip()
-    data = overpass_query(query)
-    if not data or "elements" not in data:
-        return []
-    return extract_points(data["elements"], limit)
+    return points_from_rows(overpass_table(query), limit)
 
 
-@st.cache_data(show_spinner=False, ttl=3600)
+@fallback(None)
+@cache_data(ttl=3600)
 def fetch_competitor_points(
     city: str,
     country_code: str,
@@ -763,73 +2314,239 @@ def fetch_competitor_points(
     limit: int,
     radius_m: int,
 ) -> List[dict]:
-    osm_tag = BUSINESS_OSM_MAP.get(category)
-    if osm_tag:
-        key, value = osm_tag
-        filter_part = f'["{key}"="{value}"]'
-    else:
-        keyword = category.split()[0]
-        filter_part = f'["name"~"{keyword}",i]'
+    if poi_index_covers((category,), lat, lon, radius_m):
+        index = get_poi_index(city, country_code, lat, lon)
+        return index.points([category], radius_m, limit)
+    filter_part = category_filter(category)
     area_filter = build_area_filter(city, country_code, lat, lon, radius_m)
     query = textwrap.dedent(
         f"""
-        [out:json][timeout:25];
+        [out:csv(::lat, ::lon, name, ::count; false)][timeout:25];
         (
-          node{filter_part}{area_filter};
-          way{filter_part}{area_filter};
-          relation{filter_part}{area_filter};
+          nwr{filter_part}{area_filter};
         );
-        out center;
+        out center qt {limit};
+        out count;
         """
     ).strip()
-    data = overpass_query(query)
-    if not data or "elements" not in data:
-        return []
-    return extract_points(data["elements"], limit)
-
-
-@st.cache_data(show_spinner=False, ttl=86400)
-def fetch_country_snapshot(country_code: str) -> Dict[str, Optional[float]]:
-    snapshot = {}
-    indicators = {
-        "gdp": "NY.GDP.MKTP.CD",
-        "gdp_pc": "NY.GDP.PCAP.CD",
-        "population": "SP.POP.TOTL",
-        "density": "EN.POP.DNST",
-        "inflation": "FP.CPI.TOTL.ZG",
-        "unemployment": "SL.UEM.TOTL.ZS",
-        "growth": "NY.GDP.MKTP.KD.ZG",
-        "tax_revenue": "GC.TAX.TOTL.GD.ZS",
-        "current_account": "BN.CAB.XOKA.GD.ZS",
-        "median_age": "SP.POP.MEDN",
-        "urbanization": "SP.URB.TOTL.IN.ZS",
-        "labor_force": "SL.TLF.CACT.ZS",
+    return points_from_rows(overpass_table(query), limit)
+
+
+@fallback({})
+@cache_data(ttl=86400)
+def fetch_country_snapshots(country_codes: Tuple[str, ...]) -> Dict[str, Dict[str, Optional[float]]]:
+    indicators = fetch_country_indicators.strict(country_codes)
+    return {
+        code: {key: value for key, (value, _) in indicators[code].items()}
+        for code in country_codes
     }
-    for key, code in indicators.items():
-        value, _ = fetch_indicator(country_code, code)
-        snapshot[key] = value
-    risk_score, _ = fetch_wgi_risk(country_code)
-    snapshot["risk_score"] = risk_score
-    return snapshot
-
-
-@st.cache_data(show_spinner=False, ttl=86400)
-def fetch_indicator_series(country_code: str, indicator: str, limit: int = 10) -> List[Tuple[int, float]]:
-    url = f"{WB_BASE}/country/{country_code}/indicator/{indicator}"
-    data = fetch_json(url, params={"format": "json", "per_page": str(limit)})
-    if not data or len(data) < 2:
-        return []
-    series = []
-    for row in data[1]:
-        value = row.get("value")
-        date = row.get("date")
-        if value is None or date is None:
-            continue
+
+
+def series_years() -> Tuple[int, int]:
+    last_year = datetime.utcnow().year
+    return last_year - SERIES_YEARS, last_year
+
+
+def series_frame(rows: List[Tuple[str, str, int, float]]) -> pd.DataFrame:
+    frame = pd.DataFrame(rows, columns=["country", "indicator", "year", "value"])
+    return frame.astype(
+        {"country": "category", "indicator": "category", "year": "int16", "value": "float64"}
+    ).sort_values(["country", "indicator", "year"], ignore_index=True)
+
+
+@fallback(series_frame([]))
+@cache_data(ttl=86400)
+def fetch_indicator_frame(
+    country_codes: Tuple[str, ...], indicators: Tuple[str, ...], start_year: int, end_year: int
+) -> pd.DataFrame:
+    if SNAPSHOT_OFFLINE:
+        return series_frame(get_snapshot_store().series(country_codes, indicators, start_year, end_year))
+    rows = []
+    for code, indicator, row in iter_wb_rows(country_codes, indicators, (start_year, end_year)):
         try:
-            series.append((int(date), float(value)))
+            rows.append((code, indicator, int(row.get("date")), float(row.get("value"))))
         except (TypeError, ValueError):
             continue
-    return sorted(series, key=lambda x: x[0])
+    return series_frame(rows)
+
+
+class SnapshotStore:
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS countries (iso2 TEXT, iso3 TEXT PRIMARY KEY, name TEXT);
+            CREATE TABLE IF NOT EXISTS indicator_values (
+                iso3 TEXT, iso2 TEXT, indicator TEXT, year TEXT, value REAL,
+                PRIMARY KEY (iso3, indicator, year)
+            );
+            CREATE INDEX IF NOT EXISTS indicator_values_iso2 ON indicator_values (iso2, indicator);
+            CREATE TABLE IF NOT EXISTS cities (
+                country_code TEXT, name TEXT, country TEXT, population INTEGER, lat REAL, lon REAL
+            );
+            CREATE INDEX IF NOT EXISTS cities_country ON cities (country_code);
+            CREATE TABLE IF NOT EXISTS city_costs (search_text TEXT, value REAL);
+            CREATE TABLE IF NOT EXISTS sections (name TEXT PRIMARY KEY, built_at TEXT, rows INTEGER);
+            """
+        )
+
+    def _read(self, sql: str, params: Tuple[Any, ...] = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def countries(self) -> List[Tuple[str, str, str]]:
+        return [tuple(row) for row in self._read("SELECT iso2, iso3, name FROM countries ORDER BY name")]
+
+    def latest_values(
+        self, country_codes: Tuple[str, ...], indicators: Tuple[str, ...]
+    ) -> Dict[str, Dict[str, Tuple[Optional[float], Optional[int]]]]:
+        results: Dict[str, Dict[str, Tuple[Optional[float], Optional[int]]]] = {}
+        marks = ",".join("?" for _ in indicators)
+        for code in country_codes:
+            rows = self._read(
+                f"SELECT indicator, value, year FROM indicator_values "
+                f"WHERE (iso3 = ? OR iso2 = ?) AND indicator IN ({marks}) AND value IS NOT NULL "
+                f"ORDER BY year DESC",
+                (code.upper(), code.upper()) + tuple(indicators),
+            )
+            values: Dict[str, Tuple[Optional[float], Optional[int]]] = {}
+            for indicator, value, year in rows:
+                values.setdefault(indicator, (value, year))
+            results[code] = values
+        return results
+
+    def series(
+        self, country_codes: Tuple[str, ...], indicators: Tuple[str, ...], start_year: int, end_year: int
+    ) -> List[Tuple[str, str, int, float]]:
+        rows = []
+        marks = ",".join("?" for _ in indicators)
+        for code in country_codes:
+            rows.extend(
+                (code, indicator, int(year), float(value))
+                for indicator, year, value in self._read(
+                    f"SELECT indicator, year, value FROM indicator_values "
+                    f"WHERE (iso3 = ? OR iso2 = ?) AND indicator IN ({marks}) AND value IS NOT NULL "
+                    f"AND CAST(year AS INTEGER) BETWEEN ? AND ?",
+                    (code.upper(), code.upper()) + tuple(indicators) + (start_year, end_year),
+                )
+            )
+        return rows
+
+    def cities(self, country_code: str) -> CityStore:
+        rows = self._read(
+            "SELECT name, country, population, lat, lon FROM cities WHERE country_code = ? "
+            "ORDER BY population DESC",
+            (country_code.upper(),),
+        )
+        return CityStore.from_records([CityRecord(*row) for row in rows])
+
+    def city_cost(self, city: str, country: str) -> Optional[float]:
+        rows = self._read(
+            "SELECT value FROM city_costs WHERE search_text LIKE ? AND search_text LIKE ? LIMIT 1",
+            (f"%{city.lower()}%", f"%{country.lower()}%"),
+        )
+        return rows[0][0] if rows else None
+
+    def replace(self, table: str, rows: List[tuple], where: str = "", params: Tuple[Any, ...] = ()) -> None:
+        if not rows:
+            return
+        marks = ",".join("?" for _ in rows[0])
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {table} {where}", params)
+            self._conn.executemany(f"INSERT OR REPLACE INTO {table} VALUES ({marks})", rows)
+            self._conn.commit()
+
+    def mark_built(self, section: str, rows: int) -> None:
+        self.replace(
+            "sections", [(section, datetime.utcnow().isoformat(), rows)], "WHERE name = ?", (section,)
+        )
+
+    def sections(self) -> Dict[str, Tuple[str, int]]:
+        return {name: (built_at, rows) for name, built_at, rows in self._read("SELECT * FROM sections")}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def open_snapshot_store(path: str, version: Tuple[int, int]) -> SnapshotStore:
+    return SnapshotStore(path)
+
+
+def get_snapshot_store() -> SnapshotStore:
+    try:
+        stat = os.stat(SNAPSHOT_PATH)
+    except FileNotFoundError:
+        raise FetchError(f"snapshot {SNAPSHOT_PATH} has not been built") from None
+    # cli.py snapshot build swaps in a new file; keying on it reopens the store.
+    return open_snapshot_store(SNAPSHOT_PATH, (stat.st_ino, stat.st_mtime_ns))
+
+
+def build_snapshot(
+    store: SnapshotStore,
+    sections: Tuple[str, ...] = SNAPSHOT_SECTIONS,
+    progress: Optional[Callable[[str, int, int], None]] = None,
+) -> List[str]:
+    report = progress or (lambda section, done, total: None)
+    failures = []
+    countries = fetch_countries.strict()
+    if "countries" in sections:
+        store.replace("countries", countries)
+        store.mark_built("countries", len(countries))
+        report("countries", len(countries), len(countries))
+
+    if "indicators" in sections:
+        indicators = tuple(COUNTRY_INDICATORS.values()) + SERIES_INDICATORS + WGI_INDICATORS
+        last_year = datetime.utcnow().year
+        rows = []
+        for iso3, indicator, row in iter_wb_rows(
+            None,
+            indicators,
+            (last_year - SNAPSHOT_YEARS, last_year),
+            per_page=20000,
+            progress=lambda page, pages: report("indicators", page, pages),
+        ):
+            if row.get("date") is None:
+                continue
+            iso2 = (row.get("country", {}).get("id") or "").upper()
+            rows.append((iso3, iso2, indicator, row.get("date"), row.get("value")))
+        store.replace("indicator_values", rows)
+        store.mark_built("indicators", len(rows))
+
+    if "cities" in sections:
+        scheduler = get_fetch_scheduler()
+        futures = {iso2: scheduler.submit(load_worldcities, iso2) for iso2, _, _ in countries}
+        total = 0
+        for done, (iso2, future) in enumerate(futures.items(), start=1):
+            try:
+                cities = future.result()
+            except FetchError:
+                failures.append(f"cities:{iso2}")
+                continue
+            rows = [(iso2.upper(), c.name, c.country, c.population, c.lat, c.lon) for c in cities]
+            store.replace("cities", rows, "WHERE country_code = ?", (iso2.upper(),))
+            total += len(rows)
+            report("cities", done, len(futures))
+        store.mark_built("cities", total)
+
+    if "costs" in sections:
+        data = fetch_json(ODS_BASE, params={"dataset": "numbeo", "rows": "10000"})
+        rows = []
+        for record in (data or {}).get("records", []):
+            fields = record.get("fields", {})
+            value = parse_cost(fields)
+            if value is None:
+                continue
+            text = " ".join(str(v) for v in fields.values() if isinstance(v, str)).lower()
+            rows.append((text, value))
+        store.replace("city_costs", rows)
+        store.mark_built("costs", len(rows))
+        report("costs", len(rows), len(rows))
+    return failures
 
 
 def compute_city_score(
@@ -868,90 +2585,1352 @@ def compute_demand_index(
     return pop_score * 0.5 + density_score * 0.3 + income_score * 0.2
 
 
-def get_help_answer(lang: str, question: str) -> str:
-    q = question.lower()
-    help_map = [
-        (["ranking", "score", "top"], "Usa el bloque de ranking para ajustar pesos y ver ciudades con mayor potencial."),
-        (["mapa", "map", "heatmap"], "Activa Mapa en la barra lateral; puedes activar Heatmap para densidad."),
-        (["competencia", "competition", "rival"], "Selecciona categoria y ajusta el radio para medir competencia."),
-        (["export", "descargar", "csv"], "En Exportar reportes puedes bajar CSV y reporte TXT."),
-        (["serie", "history", "historico"], "Series historicas muestra PIB, inflacion y desempleo por ano."),
-        (["alerta", "alerts"], "Alertas se activan cuando superan los umbrales del sidebar."),
-        (["watchlist", "seguimiento"], "Usa Agregar/Quitar para guardar pais y ciudad."),
-        (["recomend", "recommend"], "Recomendaciones sugiere categorias con baja competencia."),
-        (["zona", "zone", "suburb"], "Zonas se filtran por tipo en la multiseleccion."),
-        (["comparar", "compare"], "Comparar paises y ciudades esta en los bloques de comparacion."),
-    ]
-    for keywords, answer_es in help_map:
-        if any(key in q for key in keywords):
-            if lang == "en":
-                return {
-                    "Usa el bloque de ranking para ajustar pesos y ver ciudades con mayor potencial.": (
-                        "Use the ranking block to adjust weights and see top potential cities."
-                    ),
-                    "Activa Mapa en la barra lateral; puedes activar Heatmap para densidad.": (
-                        "Enable Map in the sidebar; toggle Heatmap for density."
-                    ),
-                    "Selecciona categoria y ajusta el radio para medir competencia.": (
-                        "Select a category and adjust the radius to measure competition."
-                    ),
-                    "En Exportar reportes puedes bajar CSV y reporte TXT.": (
-                        "In Export reports you can download CSV and a TXT report."
-                    ),
-                    "Series historicas muestra PIB, inflacion y desempleo por ano.": (
-                        "Historical series shows GDP, inflation, and unemployment by year."
-                    ),
-                    "Alertas se activan cuando superan los umbrales del sidebar.": (
-                        "Alerts trigger when thresholds in the sidebar are exceeded."
-                    ),
-                    "Usa Agregar/Quitar para guardar pais y ciudad.": (
-                        "Use Add/Remove to save country and city."
-                    ),
-                    "Recomendaciones sugiere categorias con baja competencia.": (
-                        "Recommendations suggest low-competition categories."
-                    ),
-                    "Zonas se filtran por tipo en la multiseleccion.": (
-                        "Zones are filtered by type in the multiselect."
-                    ),
-                    "Comparar paises y ciudades esta en los bloques de comparacion.": (
-                        "Country and city comparison live in the comparison blocks."
-                    ),
-                }.get(answer_es, t(lang, "assistant_unknown"))
-            return answer_es
-    return t(lang, "assistant_unknown")
+SCORE_FEATURES = (
+    "pop_score",
+    "gdp_score",
+    "inflation_score",
+    "unemployment_score",
+    "growth_score",
+    "risk_score",
+)
+COUNTRY_SCORE_INPUTS = ("gdp_pc", "density", "inflation", "unemployment", "growth", "risk_score")
+DEFAULT_WEIGHTS = {
+    "population": 1.2,
+    "gdp_pc": 1.0,
+    "inflation": 1.0,
+    "unemployment": 1.0,
+    "growth": 0.8,
+    "risk": 0.6,
+}
 
 
-def build_csv(rows: List[Dict[str, object]], fieldnames: List[str]) -> str:
-    buffer = io.StringIO()
-    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
-    writer.writeheader()
-    for row in rows:
-        writer.writerow(row)
-    return buffer.getvalue()
+def log_floor(values: pd.Series) -> np.ndarray:
+    return np.log(np.maximum(values.fillna(1).to_numpy(dtype=float), 1))
+
+
+def city_features(frame: pd.DataFrame, country: Optional[Dict[str, Optional[float]]] = None) -> pd.DataFrame:
+    inputs = frame.copy()
+    for key in COUNTRY_SCORE_INPUTS:
+        if key not in inputs:
+            value = (country or {}).get(key)
+            inputs[key] = np.nan if value is None else float(value)
+    features = pd.DataFrame(index=frame.index)
+    features["pop_score"] = log_floor(inputs["population"])
+    features["gdp_score"] = log_floor(inputs["gdp_pc"])
+    features["inflation_score"] = inputs["inflation"].fillna(0).to_numpy(dtype=float)
+    features["unemployment_score"] = inputs["unemployment"].fillna(0).to_numpy(dtype=float)
+    features["growth_score"] = inputs["growth"].fillna(0).to_numpy(dtype=float)
+    features["risk_score"] = inputs["risk_score"].fillna(0).to_numpy(dtype=float)
+    features["density_score"] = log_floor(inputs["density"])
+    return features
+
+
+def score_weights(weights: Dict[str, float]) -> np.ndarray:
+    return np.array(
+        [
+            weights["population"],
+            weights["gdp_pc"],
+            -weights["inflation"],
+            -weights["unemployment"],
+            weights["growth"],
+            weights["risk"],
+        ]
+    )
+
+
+def top_k(values: np.ndarray, k: int) -> np.ndarray:
+    if k >= len(values):
+        return np.argsort(-values, kind="stable")
+    candidates = np.argpartition(-values, k - 1)[:k]
+    return candidates[np.argsort(-values[candidates], kind="stable")]
+
+
+def rank_cities(features: pd.DataFrame, weights: Dict[str, float], k: int) -> pd.DataFrame:
+    scores = features[list(SCORE_FEATURES)].to_numpy() @ score_weights(weights)
+    demand = (
+        features["pop_score"].to_numpy() * 0.5
+        + features["density_score"].to_numpy() * 0.3
+        + features["gdp_score"].to_numpy() * 0.2
+    )
+    order = top_k(scores, k)
+    return pd.DataFrame(
+        {"score": scores[order], "demand_index": demand[order]}, index=features.index[order]
+    )
+
+
+def multi_country_city_table(country_codes: Tuple[Tuple[str, str], ...]) -> pd.DataFrame:
+    scheduler = get_fetch_scheduler()
+    indicators_future = scheduler.submit(fetch_country_indicators, tuple(iso3 for _, iso3 in country_codes))
+    city_futures = [scheduler.submit(fetch_worldcities, iso2) for iso2, _ in country_codes]
+    stores = [future.result() for future in city_futures]
+    table = CityStore.concat(stores).frame()
+    table["iso3"] = np.repeat([iso3 for _, iso3 in country_codes], [len(store) for store in stores])
+    indicators = indicators_future.result()
+    country_values = pd.DataFrame(
+        {
+            key: [(indicators.get(iso3) or empty_country_indicators())[key][0] for _, iso3 in country_codes]
+            for key in COUNTRY_SCORE_INPUTS
+        },
+        index=[iso3 for _, iso3 in country_codes],
+        dtype=float,
+    )
+    return table.join(country_values, on="iso3")
+
+
+FEATURE_COLUMNS = SCORE_FEATURES + ("density_score",)
+
+
+def feature_signature(indicators: Dict[str, Tuple[Optional[float], Optional[int]]]) -> str:
+    return json.dumps({key: (indicators.get(key) or (None, None))[1] for key in COUNTRY_SCORE_INPUTS}, sort_keys=True)
+
+
+def demand_scores(features: np.ndarray) -> np.ndarray:
+    columns = {name: idx for idx, name in enumerate(FEATURE_COLUMNS)}
+    return (
+        features[:, columns["pop_score"]] * 0.5
+        + features[:, columns["density_score"]] * 0.3
+        + features[:, columns["gdp_score"]] * 0.2
+    )
+
+
+class FeatureTable:
+    def __init__(self, cities: pd.DataFrame, features: np.ndarray, signatures: Dict[str, str]) -> None:
+        self.cities = cities
+        self.features = features
+        self.demand = demand_scores(features)
+        self.signatures = signatures
+        # Rows are stored grouped by country, so each country is one slice.
+        iso3 = cities["iso3"].to_numpy()
+        starts = np.flatnonzero(np.r_[True, iso3[1:] != iso3[:-1]]) if len(iso3) else np.array([], dtype=int)
+        ends = np.r_[starts[1:], len(iso3)]
+        self._slices = {iso3[start]: slice(start, end) for start, end in zip(starts, ends)}
+
+    @classmethod
+    def empty(cls) -> "FeatureTable":
+        columns = ["iso3", "name", "country", "population", "lat", "lon"]
+        return cls(pd.DataFrame(columns=columns), np.empty((0, len(FEATURE_COLUMNS))), {})
+
+    def is_fresh(self, iso3: str, signature: str) -> bool:
+        return self.signatures.get(iso3) == signature and iso3 in self._slices
+
+    def country_features(self, iso3: str, signature: str, names: np.ndarray) -> Optional[pd.DataFrame]:
+        if not self.is_fresh(iso3, signature):
+            return None
+        rows = self._slices[iso3]
+        # The page may still be loading cities; only an identical list lines up.
+        if not np.array_equal(self.cities["name"].to_numpy()[rows], names):
+            return None
+        return pd.DataFrame(self.features[rows], columns=list(FEATURE_COLUMNS))
+
+    def top_rows(self, iso3: str, n: int) -> np.ndarray:
+        rows = self._slices.get(iso3)
+        return np.arange(rows.start, min(rows.stop, rows.start + n)) if rows else np.array([], dtype=int)
+
+    def city_key(self, rows: np.ndarray) -> str:
+        names = "\n".join(str(name) for name in self.cities["name"].to_numpy()[rows])
+        return hashlib.sha256(names.encode("utf-8")).hexdigest()
+
+    def rank(self, weights: Dict[str, float], k: int, iso3s: Tuple[str, ...]) -> pd.DataFrame:
+        rows = np.concatenate(
+            [np.arange(len(self.cities))[self._slices[iso3]] for iso3 in iso3s if iso3 in self._slices]
+            or [np.array([], dtype=int)]
+        )
+        scores = self.features[rows, : len(SCORE_FEATURES)] @ score_weights(weights)
+        best = top_k(scores, k)
+        ranked = self.cities.iloc[rows[best]][["name", "country"]].reset_index(drop=True)
+        ranked["score"] = scores[best]
+        ranked["demand_index"] = self.demand[rows[best]]
+        return ranked
+
+
+class FeatureStore:
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        feature_columns = ", ".join(f"{name} REAL" for name in FEATURE_COLUMNS)
+        self._conn.executescript(
+            f"""
+            CREATE TABLE IF NOT EXISTS city_features (
+                iso3 TEXT, position INTEGER, name TEXT, country TEXT, population REAL, lat REAL, lon REAL,
+                {feature_columns}, PRIMARY KEY (iso3, position)
+            );
+            CREATE TABLE IF NOT EXISTS feature_versions (
+                iso3 TEXT PRIMARY KEY, signature TEXT, rows INTEGER, built_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS poi_counts (
+                iso3 TEXT, category TEXT, radius_m INTEGER, city_key TEXT, counts BLOB, built_at TEXT,
+                PRIMARY KEY (iso3, category, radius_m)
+            );
+            """
+        )
+
+    def versions(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT iso3, signature FROM feature_versions").fetchall())
+
+    def version(self) -> str:
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*), MAX(built_at) FROM feature_versions").fetchone()
+        return f"{row[0]}:{row[1]}"
+
+    def replace_country(self, iso3: str, cities: pd.DataFrame, features: pd.DataFrame, signature: str) -> None:
+        rows = list(
+            zip(
+                [iso3] * len(cities),
+                range(len(cities)),
+                cities["name"].to_numpy(),
+                cities["country"].astype(str).to_numpy(),
+                *(cities[column].to_numpy(dtype=float) for column in ("population", "lat", "lon")),
+                *(features[column].to_numpy(dtype=float) for column in FEATURE_COLUMNS),
+            )
+        )
+        marks = ",".join("?" for _ in range(6 + 1 + len(FEATURE_COLUMNS)))
+        with self._lock:
+            self._conn.execute("DELETE FROM city_features WHERE iso3 = ?", (iso3,))
+            self._conn.executemany(f"INSERT INTO city_features VALUES ({marks})", rows)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO feature_versions VALUES (?, ?, ?, ?)",
+                (iso3, signature, len(rows), datetime.utcnow().isoformat()),
+            )
+            self._conn.commit()
+
+    def replace_poi_counts(
+        self, iso3: str, category: str, radius_m: int, city_key: str, counts: np.ndarray
+    ) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO poi_counts VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    iso3,
+                    category,
+                    int(radius_m),
+                    city_key,
+                    counts.astype(np.int32).tobytes(),
+                    datetime.utcnow().isoformat(),
+                ),
+            )
+            self._conn.commit()
+
+    def poi_counts(
+        self, iso3s: Tuple[str, ...], category: str, radius_m: int
+    ) -> Dict[str, Tuple[int, str, np.ndarray]]:
+        marks = ",".join("?" for _ in iso3s)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT iso3, radius_m, city_key, counts FROM poi_counts "
+                f"WHERE category = ? AND radius_m = ? AND iso3 IN ({marks})",
+                (category, int(radius_m), *iso3s),
+            ).fetchall()
+        return {iso3: (radius_m, key, np.frombuffer(blob, dtype=np.int32)) for iso3, radius_m, key, blob in rows}
+
+    def load(self) -> FeatureTable:
+        with self._lock:
+            frame = pd.read_sql_query("SELECT * FROM city_features ORDER BY iso3, position", self._conn)
+            signatures = dict(self._conn.execute("SELECT iso3, signature FROM feature_versions").fetchall())
+        if frame.empty:
+            return FeatureTable(FeatureTable.empty().cities, FeatureTable.empty().features, signatures)
+        features = frame[list(FEATURE_COLUMNS)].to_numpy(dtype=float)
+        cities = frame[["iso3", "name", "country", "population", "lat", "lon"]]
+        cities = cities.astype({"iso3": "category", "country": "category"})
+        return FeatureTable(cities, features, signatures)
+
+
+@st.cache_resource(show_spinner=False)
+def open_feature_store(path: str) -> FeatureStore:
+    return FeatureStore(path)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_feature_table(path: str, version: str) -> FeatureTable:
+    return open_feature_store(path).load()
+
+
+def get_feature_table() -> FeatureTable:
+    if not FEATURES_PATH:
+        return FeatureTable.empty()
+    try:
+        return load_feature_table(FEATURES_PATH, open_feature_store(FEATURES_PATH).version())
+    except sqlite3.Error:
+        return FeatureTable.empty()
+
+
+def refresh_features(
+    store: FeatureStore,
+    countries: List[Tuple[str, str, str]],
+    force: bool = False,
+    progress: Optional[Callable[[str, int, int], None]] = None,
+) -> Tuple[List[str], List[str]]:
+    report = progress or (lambda section, done, total: None)
+    indicators = fetch_country_indicators.strict(tuple(iso3 for _, iso3, _ in countries))
+    versions = store.versions()
+    stale = [
+        (iso2, iso3)
+        for iso2, iso3, _ in countries
+        if force or versions.get(iso3) != feature_signature(indicators.get(iso3) or empty_country_indicators())
+    ]
+    scheduler = get_fetch_scheduler()
+    # The full city list, as the page loads it, so stored rows line up with it.
+    futures = {iso3: scheduler.submit(load_worldcities, iso2) for iso2, iso3 in stale}
+    refreshed, failures = [], []
+    for done, (iso3, future) in enumerate(futures.items(), start=1):
+        try:
+            cities = future.result()
+        except FetchError as exc:
+            failures.append(f"{iso3}: {exc}")
+        else:
+            values = indicators.get(iso3) or empty_country_indicators()
+            frame = cities.frame()
+            features = city_features(frame, {key: values[key][0] for key in COUNTRY_SCORE_INPUTS})
+            store.replace_country(iso3, frame, features, feature_signature(values))
+            refreshed.append(iso3)
+        report("features", done, len(futures))
+    return refreshed, failures
+
+
+_MATERIALIZING: set = set()
+_MATERIALIZING_LOCK = threading.Lock()
+
+
+def materialize_in_background(iso3: str, signature: str, cities: pd.DataFrame, features: pd.DataFrame) -> None:
+    if not FEATURES_PATH:
+        return
+    with _MATERIALIZING_LOCK:
+        if iso3 in _MATERIALIZING:
+            return
+        _MATERIALIZING.add(iso3)
+
+    def run() -> None:
+        try:
+            open_feature_store(FEATURES_PATH).replace_country(iso3, cities, features, signature)
+        except sqlite3.Error:
+            pass
+        finally:
+            with _MATERIALIZING_LOCK:
+                _MATERIALIZING.discard(iso3)
+
+    get_fetch_scheduler().submit(run)
+
+
+def rank_across_countries(
+    country_codes: Tuple[Tuple[str, str], ...], weights: Dict[str, float], k: int
+) -> pd.DataFrame:
+    iso3s = tuple(iso3 for _, iso3 in country_codes)
+    indicators = fetch_country_indicators(iso3s)
+    signatures = {iso3: feature_signature(indicators.get(iso3) or empty_country_indicators()) for iso3 in iso3s}
+    table = get_feature_table()
+    if all(table.is_fresh(iso3, signature) for iso3, signature in signatures.items()):
+        return table.rank(weights, k, iso3s)
+    # Without fresh features for every country, fall back to each country's
+    # largest cities; those partial lists are never materialized.
+    city_table = multi_country_city_table(country_codes)
+    ranked = rank_cities(city_features(city_table), weights, k)
+    rows = city_table.loc[ranked.index]
+    return pd.DataFrame(
+        {
+            "name": rows["name"].to_numpy(),
+            "country": rows["country"].astype(str).to_numpy(),
+            "score": ranked["score"].to_numpy(),
+            "demand_index": ranked["demand_index"].to_numpy(),
+        }
+    )
+
+
+def build_poi_matrix(
+    store: FeatureStore,
+    table: FeatureTable,
+    countries: List[Tuple[str, str]],
+    categories: Tuple[str, ...],
+    radius_m: int = DEFAULT_RADIUS_KM * 1000,
+    progress: Optional[Callable[[str, int, int], None]] = None,
+) -> Tuple[List[str], List[str]]:
+    report = progress or (lambda section, done, total: None)
+    indexed = [(iso2, iso3) for iso2, iso3 in countries if len(table.top_rows(iso3, 1))]
+    built = []
+    failures = [f"{iso3}: no city features" for iso2, iso3 in countries if (iso2, iso3) not in indexed]
+    # Extracts run one at a time on the caller's thread: each can take
+    # POI_MATRIX_TIMEOUT and would otherwise pin shared scheduler workers.
+    for done, (iso2, iso3) in enumerate(indexed, start=1):
+        try:
+            points = fetch_country_pois(iso2, categories)
+        except FetchError as exc:
+            failures.append(f"{iso3}: {exc}")
+        else:
+            rows = table.top_rows(iso3, POI_MATRIX_CITIES)
+            lats = table.cities["lat"].to_numpy(dtype=float)[rows]
+            lons = table.cities["lon"].to_numpy(dtype=float)[rows]
+            for category in categories:
+                counts = count_within(lats, lons, points[category], radius_m)
+                store.replace_poi_counts(iso3, category, radius_m, table.city_key(rows), counts)
+            built.append(iso3)
+        report("poi counts", done, len(indexed))
+    return built, failures
+
+
+class PoiMatrixBuilds:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._running: set = set()
+        self._failed: set = set()
+
+    def start(
+        self, store: FeatureStore, table: FeatureTable, countries: List[Tuple[str, str]], category: str, radius_m: int
+    ) -> None:
+        with self._lock:
+            pending = [code for code in countries if (code[1], category, radius_m) not in self._running]
+            for _, iso3 in pending:
+                self._running.add((iso3, category, radius_m))
+                self._failed.discard((iso3, category, radius_m))
+        if not pending:
+            return
+
+        def run() -> None:
+            built: List[str] = []
+            try:
+                built, _ = build_poi_matrix(store, table, pending, (category,), radius_m)
+            except sqlite3.Error:
+                pass
+            finally:
+                with self._lock:
+                    for _, iso3 in pending:
+                        self._running.discard((iso3, category, radius_m))
+                        if iso3 not in built:
+                            self._failed.add((iso3, category, radius_m))
+
+        # Country-wide extracts can run for POI_MATRIX_TIMEOUT, far too long for a
+        # fragment run or a shared scheduler worker.
+        start_daemon(run, "poi-build")
+
+    def status(self, iso3s: Tuple[str, ...], category: str, radius_m: int) -> Tuple[List[str], List[str]]:
+        with self._lock:
+            running = [iso3 for iso3 in iso3s if (iso3, category, radius_m) in self._running]
+            failed = [iso3 for iso3 in iso3s if (iso3, category, radius_m) in self._failed]
+        return running, failed
+
+
+@st.cache_resource(show_spinner=False)
+def get_poi_matrix_builds() -> PoiMatrixBuilds:
+    return PoiMatrixBuilds()
+
+
+CATEGORY_RANK_COLUMNS = ["name", "country", "demand_index", "competitors", "density_km2", "opportunity"]
+
+
+def rank_category(
+    table: FeatureTable, counts: Dict[str, Tuple[int, str, np.ndarray]], iso3s: Tuple[str, ...], k: int
+) -> Tuple[pd.DataFrame, List[str]]:
+    frames, missing = [], []
+    for iso3 in iso3s:
+        entry = counts.get(iso3)
+        rows = table.top_rows(iso3, len(entry[2]) if entry else 0)
+        # Counts are positional, so they only apply to the city list they were built for.
+        if entry is None or not len(rows) or table.city_key(rows) != entry[1]:
+            missing.append(iso3)
+            continue
+        radius_m, _, competitors = entry
+        area_km2 = math.pi * (radius_m / 1000) ** 2
+        frame = table.cities.iloc[rows][["name", "country"]].reset_index(drop=True)
+        frame["demand_index"] = table.demand[rows]
+        frame["competitors"] = competitors
+        frame["density_km2"] = competitors / area_km2
+        # One virtual competitor keeps untouched markets finite and ordered by demand.
+        frame["opportunity"] = frame["demand_index"] / ((competitors + 1) / area_km2)
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=CATEGORY_RANK_COLUMNS), missing
+    ranked = pd.concat(frames, ignore_index=True)
+    best = top_k(ranked["opportunity"].to_numpy(), k)
+    return ranked.iloc[best].reset_index(drop=True), missing
+
+
+def warmup_steps(country_code: str, iso3: str) -> Iterator[Tuple[str, Callable[[], Any]]]:
+    # Same arguments as main() so the warmed entries are the ones the page reads.
+    yield f"{country_code} snapshot", functools.partial(fetch_country_snapshots.strict, (iso3,))
+    yield f"{country_code} series", functools.partial(
+        fetch_indicator_frame.strict, (iso3,), SERIES_INDICATORS, *series_years()
+    )
+    yield f"{country_code} cities", functools.partial(fetch_worldcities.strict, country_code)
+    for city in fetch_worldcities(country_code).top_by_population(WARMUP_TOP_CITIES):
+        yield f"{country_code} counts {city.name}", functools.partial(
+            fetch_competitor_counts.strict,
+            city.name,
+            country_code,
+            REC_CANDIDATES,
+            city.lat,
+            city.lon,
+            DEFAULT_RADIUS_KM * 1000,
+        )
+
+
+class WarmupWorker:
+    def __init__(self, country_codes: Tuple[str, ...], pause: float = WARMUP_PAUSE_SECONDS) -> None:
+        self.country_codes = country_codes
+        self.pause = pause
+        self.done = False
+        self.warmed = 0
+        self.cold: List[str] = []
+        self._lock = threading.Lock()
+
+    def run(self, report: Optional[Callable[[str, int, int], None]] = None) -> List[str]:
+        iso3_by_code = {iso2.upper(): iso3 for iso2, iso3, _ in fetch_countries()}
+        try:
+            for number, country_code in enumerate(self.country_codes, start=1):
+                iso3 = iso3_by_code.get(country_code)
+                if iso3 is None:
+                    self._mark_cold(f"{country_code} unknown country")
+                for label, step in warmup_steps(country_code, iso3) if iso3 else ():
+                    try:
+                        step()
+                    except FetchError:
+                        self._mark_cold(label)
+                    # Sequential steps with a pause keep warm-up traffic well under
+                    # the per-host slots that interactive sessions also draw from.
+                    time.sleep(self.pause)
+                self.warmed = number
+                if report:
+                    report("warmup", number, len(self.country_codes))
+        finally:
+            self.done = True
+        return self.remaining()
+
+    def start(self) -> "WarmupWorker":
+        start_daemon(self.run, "warmup")
+        return self
+
+    def remaining(self) -> List[str]:
+        with self._lock:
+            return list(self.cold)
+
+    def _mark_cold(self, label: str) -> None:
+        with self._lock:
+            self.cold.append(label)
+
+
+@st.cache_resource(show_spinner=False)
+def get_warmup_worker() -> WarmupWorker:
+    return WarmupWorker(WARMUP_COUNTRIES).start()
+
+
+def get_help_answer(lang: str, question: str) -> str:
+    q = question.lower()
+    help_map = [
+        (["ranking", "score", "top"], "Usa el bloque de ranking para ajustar pesos y ver ciudades con mayor potencial."),
+        (["mapa", "map", "heatmap"], "Activa Mapa en la barra lateral; puedes activar Heatmap para densidad."),
+        (["competencia", "competition", "rival"], "Selecciona categoria y ajusta el radio para medir competencia."),
+        (["export", "descargar", "csv"], "En Exportar reportes puedes bajar CSV y reporte TXT."),
+        (["serie", "history", "historico"], "Series historicas muestra PIB, inflacion y desempleo por ano."),
+        (["alerta", "alerts"], "Alertas se activan cuando superan los umbrales del sidebar."),
+        (["watchlist", "seguimiento"], "Usa Agregar/Quitar para guardar pais y ciudad."),
+        (["recomend", "recommend"], "Recomendaciones sugiere categorias con baja competencia."),
+        (["zona", "zone", "suburb"], "Zonas se filtran por tipo en la multiseleccion."),
+        (["comparar", "compare"], "Comparar paises y ciudades esta en los bloques de comparacion."),
+    ]
+    for keywords, answer_es in help_map:
+        if any(key in q for key in keywords):
+            if lang == "en":
+                return {
+                    "Usa el bloque de ranking para ajustar pesos y ver ciudades con mayor potencial.": (
+                        "Use the ranking block to adjust weights and see top potential cities."
+                    ),
+                    "Activa Mapa en la barra lateral; puedes activar Heatmap para densidad.": (
+                        "Enable Map in the sidebar; toggle Heatmap for density."
+                    ),
+                    "Selecciona categoria y ajusta el radio para medir competencia.": (
+                        "Select a category and adjust the radius to measure competition."
+                    ),
+                    "En Exportar reportes puedes bajar CSV y reporte TXT.": (
+                        "In Export reports you can download CSV and a TXT report."
+                    ),
+                    "Series historicas muestra PIB, inflacion y desempleo por ano.": (
+                        "Historical series shows GDP, inflation, and unemployment by year."
+                    ),
+                    "Alertas se activan cuando superan los umbrales del sidebar.": (
+                        "Alerts trigger when thresholds in the sidebar are exceeded."
+                    ),
+                    "Usa Agregar/Quitar para guardar pais y ciudad.": (
+                        "Use Add/Remove to save country and city."
+                    ),
+                    "Recomendaciones sugiere categorias con baja competencia.": (
+                        "Recommendations suggest low-competition categories."
+                    ),
+                    "Zonas se filtran por tipo en la multiseleccion.": (
+                        "Zones are filtered by type in the multiselect."
+                    ),
+                    "Comparar paises y ciudades esta en los bloques de comparacion.": (
+                        "Country and city comparison live in the comparison blocks."
+                    ),
+                }.get(answer_es, t(lang, "assistant_unknown"))
+            return answer_es
+    return t(lang, "assistant_unknown")
+
+
+def build_csv(rows: List[Dict[str, object]], fieldnames: List[str]) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+    return buffer.getvalue()
+
+
+def format_number(value: Optional[float]) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, (int, float)) and value > 1_000_000:
+        return f"{value:,.0f}"
+    if isinstance(value, (int, float)):
+        return f"{value:,.2f}"
+    return str(value)
+
+
+def risk_level_label(score: Optional[float], lang: str) -> str:
+    if score is None:
+        return "-"
+    if score >= 1:
+        return t(lang, "risk_low")
+    if score >= 0:
+        return t(lang, "risk_medium")
+    return t(lang, "risk_high")
+
+
+@st.fragment(run_every=2)
+def render_city_progress(lang: str, loader: CityLoader) -> None:
+    if loader.done:
+        st.rerun()
+    st.caption(t(lang, "cities_loading").format(count=format_number(loader.loaded())))
+
+
+@st.fragment(run_every=2)
+def render_poi_build_progress(lang: str, iso3s: Tuple[str, ...], category: str, radius_m: int) -> None:
+    running, _ = get_poi_matrix_builds().status(iso3s, category, radius_m)
+    if not running:
+        st.rerun()
+    st.caption(t(lang, "best_city_building").format(countries=", ".join(running)))
+
+
+def render_city_failure(lang: str, loader: CityLoader) -> None:
+    failed = st.session_state.failed_city_loaders
+    if failed.get(loader.country_code) is not loader:
+        failed[loader.country_code] = loader
+        # Keep the partial list out of the shared cache; other sessions load afresh.
+        get_city_loader.clear(loader.country_code)
+    st.warning(t(lang, "cities_failed").format(count=format_number(loader.loaded())))
+    if st.button(t(lang, "cities_retry"), key="cities_retry"):
+        failed.pop(loader.country_code, None)
+        st.rerun()
+
+
+@st.fragment(run_every=5)
+def render_warmup_progress(lang: str, worker: WarmupWorker) -> None:
+    if worker.done:
+        st.rerun()
+    render_warmup_status(lang, worker)
+
+
+def render_warmup_status(lang: str, worker: WarmupWorker) -> None:
+    st.caption(t(lang, "warmup_progress").format(done=worker.warmed, total=len(worker.country_codes)))
+    cold = worker.remaining()
+    if cold:
+        with st.expander(t(lang, "warmup_cold"), expanded=False):
+            st.write(", ".join(cold))
+
+
+@dataclass
+class PageState:
+    lang: str
+    country_name: str
+    iso2: str
+    iso3: str
+    indicators: Dict[str, Tuple[Optional[float], Optional[int]]]
+    weights: Dict[str, float]
+    radius_m: int
+
+    def value(self, key: str) -> Optional[float]:
+        return self.indicators[key][0]
+
+    def year(self, key: str) -> Optional[int]:
+        return self.indicators[key][1]
+
+
+def rank_country_cities(
+    state: PageState, city_table: pd.DataFrame, k: int, complete: bool = False
+) -> Tuple[pd.DataFrame, List[Tuple[str, float]]]:
+    signature = feature_signature(state.indicators)
+    features = get_feature_table().country_features(state.iso3, signature, city_table["name"].to_numpy())
+    if features is None:
+        features = city_features(city_table, {key: state.value(key) for key in COUNTRY_SCORE_INPUTS})
+        if complete and len(city_table):
+            materialize_in_background(state.iso3, signature, city_table, features)
+    features.index = city_table.index
+    top_ranked = rank_cities(features, state.weights, k)
+    return features, list(zip(city_table.loc[top_ranked.index, "name"], top_ranked["score"]))
+
+
+def build_country_csv(state: PageState) -> str:
+    country_rows = [{"country": state.country_name, **{key: state.value(key) for key in EXPORT_COUNTRY_FIELDS}}]
+    return build_csv(country_rows, list(country_rows[0].keys()))
+
+
+def build_cities_csv(ranked: List[Tuple[str, float]]) -> str:
+    city_rows = []
+    for city_name, score in ranked:
+        city_rows.append({"city": city_name, "score": score})
+    return build_csv(city_rows, ["city", "score"])
+
+
+def build_series_csv(series: pd.DataFrame) -> str:
+    return series.to_csv(index=False)
+
+
+def build_report_text(
+    state: PageState,
+    city_choice: str,
+    city_cost: Optional[float],
+    potential_clients: Optional[float],
+    competitors: Optional[Dict[str, int]] = None,
+) -> str:
+    value = state.value
+    lines = [
+        f"Report generated: {datetime.utcnow().isoformat()}Z",
+        f"Country: {state.country_name}",
+        f"GDP: {value('gdp')}",
+        f"GDP per capita: {value('gdp_pc')}",
+        f"Population: {value('population')}",
+        f"Inflation: {value('inflation')}",
+        f"Unemployment: {value('unemployment')}",
+        f"Growth: {value('growth')}",
+        f"Risk score: {value('risk_score')}",
+        f"City: {city_choice}",
+        f"Cost per m2: {city_cost}",
+        f"Potential clients: {potential_clients}",
+    ]
+    for category, count in (competitors or {}).items():
+        lines.append(f"Competitors ({category}): {count}")
+    return "\n".join(lines)
+
+
+@timed_section
+def render_country_metrics(state: PageState, alerts: Dict[str, float]) -> None:
+    lang = state.lang
+    value = state.value
+    year = state.year
+
+    st.subheader(t(lang, "country_metrics"))
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric(t(lang, "gdp"), format_number(value("gdp")))
+    col2.metric(t(lang, "gdp_pc"), format_number(value("gdp_pc")))
+    col3.metric(t(lang, "population"), format_number(value("population")))
+    col4.metric(t(lang, "density"), format_number(value("density")))
+    st.caption(
+        f"{t(lang, 'updated')}: "
+        f"{year('gdp') or '-'}, {year('gdp_pc') or '-'}, {year('population') or '-'}, {year('density') or '-'}"
+    )
+
+    st.subheader(t(lang, "econ_block"))
+    econ1, econ2, econ3, econ4 = st.columns(4)
+    econ1.metric(t(lang, "inflation"), format_number(value("inflation")))
+    econ2.metric(t(lang, "unemployment"), format_number(value("unemployment")))
+    econ3.metric(t(lang, "growth"), format_number(value("growth")))
+    econ4.metric(t(lang, "tax_revenue"), format_number(value("tax_revenue")))
+    econ5, econ6, econ7 = st.columns(3)
+    econ5.metric(t(lang, "current_account"), format_number(value("current_account")))
+    econ6.metric(t(lang, "urbanization"), format_number(value("urbanization")))
+    econ7.metric(t(lang, "labor_force"), format_number(value("labor_force")))
+    st.caption(
+        f"{t(lang, 'updated')}: "
+        f"{year('inflation') or '-'}, {year('unemployment') or '-'}, {year('growth') or '-'}, "
+        f"{year('tax_revenue') or '-'}, {year('current_account') or '-'}, {year('urbanization') or '-'}, "
+        f"{year('labor_force') or '-'}"
+    )
+
+    st.subheader(t(lang, "risk_block"))
+    risk1, risk2, risk3 = st.columns(3)
+    risk1.metric(t(lang, "risk_score"), format_number(value("risk_score")))
+    risk2.metric(t(lang, "risk_level"), risk_level_label(value("risk_score"), lang))
+    risk3.metric(t(lang, "median_age"), format_number(value("median_age")))
+    st.caption(f"{t(lang, 'updated')}: {year('risk_score') or '-'}, {year('median_age') or '-'}")
+
+    st.subheader(t(lang, "alerts_block"))
+    inflation = value("inflation")
+    unemployment = value("unemployment")
+    risk_score = value("risk_score")
+    if inflation is not None and inflation > alerts["inflation"]:
+        st.warning(f"{t(lang, 'inflation')}: {format_number(inflation)}")
+    if unemployment is not None and unemployment > alerts["unemployment"]:
+        st.warning(f"{t(lang, 'unemployment')}: {format_number(unemployment)}")
+    if risk_score is not None and risk_score < alerts["risk"]:
+        st.warning(f"{t(lang, 'risk_score')}: {format_number(risk_score)}")
+
+    st.subheader(t(lang, "summary_block"))
+    indicator_values = [value_ for value_, _ in state.indicators.values()]
+    available = sum(1 for value_ in indicator_values if value_ is not None)
+    data_quality = available / len(indicator_values) * 100
+    summary1, summary2, summary3 = st.columns(3)
+    demand_index = compute_demand_index(None, value("density"), value("gdp_pc"))
+    composite_score = compute_city_score(
+        None,
+        value("gdp_pc"),
+        inflation,
+        unemployment,
+        value("growth"),
+        risk_score,
+        state.weights,
+    )
+    summary1.metric(t(lang, "composite_score"), format_number(composite_score))
+    summary2.metric(t(lang, "demand_index"), format_number(demand_index))
+    summary3.metric(t(lang, "data_quality"), f"{data_quality:.0f}%")
+
+
+@timed_section
+def render_ranking(
+    state: PageState, cities: CityStore, complete: bool
+) -> Tuple[List[Tuple[str, float]], List[CityRecord]]:
+    lang = state.lang
+    years = [int(year) for _, year in state.indicators.values() if year]
+    latest_year = max(years) if years else None
+
+    st.markdown(f"<div class='section-title'>{t(lang, 'data_notes')}</div>", unsafe_allow_html=True)
+    snap1, snap2, snap3 = st.columns(3)
+    snap1.metric(t(lang, "latest_year_label"), latest_year or "-")
+    snap2.metric(t(lang, "cities_indexed_label"), format_number(len(cities)))
+    snap3.metric(t(lang, "top_city_pop_label"), format_number(cities.max_population()))
+    top_cities = list(cities.top_by_population(10))
+
+    st.subheader(t(lang, "top_cities"))
+    top_cols = st.columns(3)
+    gdp_pc = state.value("gdp_pc")
+    for idx, city in enumerate(top_cities[:3]):
+        score = (city.population or 0) * (gdp_pc or 0) / 1_000_000 if gdp_pc else 0
+        top_cols[idx].markdown(
+            f"**{city.name}**  \n"
+            f"Pop: {format_number(city.population)}  \n"
+            f"Score: {format_number(score)}"
+        )
+
+    st.subheader(t(lang, "ranking_block"))
+    st.caption(t(lang, "ranking_note"))
+    city_table = cities.frame()
+    features, ranked = rank_country_cities(state, city_table, 10, complete)
+    st.table({"City": [c for c, _ in ranked], "Score": [format_number(s) for _, s in ranked]})
+
+    render_city_compare(state, city_table, features, [city.name for city in top_cities])
+    return ranked, top_cities
+
+
+@st.fragment
+@timed_section
+def render_city_compare(
+    state: PageState, city_table: pd.DataFrame, features: pd.DataFrame, top_names: List[str]
+) -> None:
+    lang = state.lang
+    st.subheader(t(lang, "compare_cities"))
+    compare_city_names = st.multiselect(t(lang, "compare_cities"), top_names, default=top_names[:3])
+    if compare_city_names:
+        compare_mask = city_table["name"].isin(compare_city_names).to_numpy()
+        compare_scores = features[list(SCORE_FEATURES)].to_numpy()[compare_mask] @ score_weights(state.weights)
+        df_compare = pd.DataFrame(
+            {
+                "city": city_table["name"][compare_mask].to_numpy(),
+                "population": city_table["population"][compare_mask].fillna(0).to_numpy(),
+                "score": compare_scores,
+            }
+        ).drop_duplicates("city")
+        df_long = df_compare.melt(id_vars=["city"], value_vars=["population", "score"], var_name="metric", value_name="value")
+        chart = (
+            alt.Chart(df_long)
+            .mark_bar()
+            .encode(
+                x=alt.X("city:N", sort=None),
+                y=alt.Y("value:Q"),
+                color=alt.Color("metric:N"),
+                tooltip=["city", "metric", "value"],
+            )
+        )
+        st.altair_chart(chart, use_container_width=True)
+
+
+def estimate_potential_clients(state: PageState, city: Optional[CityRecord]) -> Optional[float]:
+    if not city or not city.population:
+        return None
+    labor_force = state.value("labor_force")
+    if labor_force is None:
+        return city.population
+    participation = labor_force / 100
+    employment_rate = 1 - (state.value("unemployment") or 0) / 100
+    return city.population * participation * employment_rate
+
+
+@timed_section
+def render_city_detail(
+    state: PageState,
+    city_choice: str,
+    city_cost: Optional[float],
+    potential_clients: Optional[float],
+    city_demand: float,
+) -> None:
+    lang = state.lang
+    st.subheader(t(lang, "visual_block"))
+    st.caption(t(lang, "visual_note"))
+    flag_url = f"https://flagcdn.com/w160/{state.iso2.lower()}.png"
+    skyline_query = city_choice.replace(" ", "%20")
+    skyline_url = f"https://source.unsplash.com/featured/900x600/?{skyline_query},skyline,finance"
+    visual1, visual2 = st.columns(2)
+    visual1.image(flag_url, caption=state.country_name, use_container_width=True)
+    visual2.image(skyline_url, caption=city_choice, use_container_width=True)
+
+    city_rent = fetch_city_rent(city_choice, state.country_name)
+    st.subheader(t(lang, "housing_block"))
+    house1, house2, house3, house4 = st.columns(4)
+    house1.metric(t(lang, "cost_m2"), format_number(city_cost))
+    house2.metric(t(lang, "rent_month"), format_number(city_rent))
+    house3.metric(t(lang, "potential_clients"), format_number(potential_clients))
+    house4.metric(t(lang, "demand_index"), format_number(city_demand))
+
+
+@st.fragment
+@timed_section
+def render_competition(
+    state: PageState,
+    city_choice: str,
+    selected_city: Optional[CityRecord],
+    city_demand: float,
+    prefetched: Dict[str, Future],
+    show_map: bool,
+    show_best: bool,
+) -> None:
+    lang = state.lang
+    city_lat = selected_city.lat if selected_city else None
+    city_lon = selected_city.lon if selected_city else None
+    st.subheader(t(lang, "business_category"))
+    search_term = st.text_input(t(lang, "search_business"))
+    categories = [c for c in BUSINESS_CATEGORIES if search_term.lower() in c.lower()] if search_term else BUSINESS_CATEGORIES
+    category_choice = st.selectbox(t(lang, "business_category"), categories)
+
+    zone_type_options = list(ZONE_TYPES)
+    zone_types = st.multiselect(t(lang, "zone_types"), zone_type_options, default=zone_type_options)
+
+    competitors_future = get_fetch_scheduler().submit(
+        fetch_competitors, city_choice, state.iso2, category_choice, city_lat, city_lon, state.radius_m
+    )
+
+    zones = prefetched["zones"].result()
+    st.subheader(t(lang, "city_zones"))
+    if zones is None:
+        st.warning(t(lang, "overpass_failed"))
+    elif zones:
+        st.write(", ".join(zones[:50]))
+    else:
+        st.info(t(lang, "zones_empty"))
+
+    malls_offices = prefetched["malls"].result()
+    st.subheader(t(lang, "malls_offices"))
+    if malls_offices is None:
+        st.warning(t(lang, "overpass_failed"))
+    elif malls_offices:
+        st.write(", ".join(malls_offices[:50]))
+    else:
+        st.info(t(lang, "pois_empty"))
+
+    st.subheader(t(lang, "competition"))
+    competitors = competitors_future.result()
+    if competitors is None:
+        st.warning(t(lang, "overpass_failed"))
+    elif competitors:
+        st.metric(t(lang, "competition_count"), competitors)
+    else:
+        st.info(t(lang, "category_empty"))
+
+    st.subheader(t(lang, "recommendations"))
+    st.caption(t(lang, "recommendation_note"))
+    rec_counts = prefetched["recommendations"].result()
+    if rec_counts is None:
+        st.warning(t(lang, "overpass_failed"))
+    else:
+        rec_rows = []
+        for category in REC_CANDIDATES:
+            count = rec_counts.get(category, 0)
+            score = city_demand / max(count + 1, 1)
+            rec_rows.append({"category": category, "score": score, "competitors": count})
+        rec_rows = sorted(rec_rows, key=lambda x: x["score"], reverse=True)[:3]
+        st.table(
+            {
+                t(lang, "table_category"): [row["category"] for row in rec_rows],
+                t(lang, "table_competitors"): [row["competitors"] for row in rec_rows],
+            }
+        )
+
+    if show_map:
+        render_map(state, city_choice, selected_city, category_choice, zone_types)
+    if show_best:
+        render_best_categories(state, city_choice, selected_city)
+
+
+@st.fragment
+@timed_section
+def render_map(
+    state: PageState,
+    city_choice: str,
+    selected_city: Optional[CityRecord],
+    category_choice: str,
+    zone_types: List[str],
+) -> None:
+    lang = state.lang
+    st.subheader(t(lang, "map_block"))
+    map_col1, map_col2 = st.columns(2)
+    max_points = map_col1.slider(t(lang, "max_points"), 50, 300, 150, 50)
+    show_heatmap = map_col2.checkbox(t(lang, "heatmap"), value=False)
+    if not selected_city or selected_city.lat is None or selected_city.lon is None:
+        st.info(t(lang, "map_empty"))
+        return
+    scheduler = get_fetch_scheduler()
+    zone_future = scheduler.submit(
+        fetch_zone_points,
+        city_choice,
+        state.iso2,
+        selected_city.lat,
+        selected_city.lon,
+        zone_types,
+        max_points,
+        state.radius_m,
+    )
+    competitor_future = scheduler.submit(
+        fetch_competitor_points,
+        city_choice,
+        state.iso2,
+        category_choice,
+        selected_city.lat,
+        selected_city.lon,
+        max_points,
+        state.radius_m,
+    )
+    zone_points = zone_future.result()
+    competitor_points = competitor_future.result()
+    if zone_points is None or competitor_points is None:
+        st.warning(t(lang, "overpass_failed"))
+    if not zone_points and not competitor_points:
+        if zone_points is not None and competitor_points is not None:
+            st.info(t(lang, "map_empty"))
+        return
+    layers = []
+    if zone_points:
+        layers.append(
+            pdk.Layer(
+                "ScatterplotLayer",
+                data=zone_points,
+                get_position="[lon, lat]",
+                get_radius=200,
+                get_fill_color=[60, 120, 200, 160],
+                pickable=True,
+            )
+        )
+    if competitor_points:
+        layers.append(
+            pdk.Layer(
+                "ScatterplotLayer",
+                data=competitor_points,
+                get_position="[lon, lat]",
+                get_radius=150,
+                get_fill_color=[220, 60, 60, 160],
+                pickable=True,
+            )
+        )
+        if show_heatmap:
+            layers.append(
+                pdk.Layer(
+                    "HeatmapLayer",
+                    data=competitor_points,
+                    get_position="[lon, lat]",
+                    radius_pixels=60,
+                )
+            )
+    view = pdk.ViewState(
+        latitude=selected_city.lat,
+        longitude=selected_city.lon,
+        zoom=11,
+        pitch=0,
+    )
+    st.pydeck_chart(
+        pdk.Deck(
+            layers=layers,
+            initial_view_state=view,
+            tooltip={"text": "{name}"},
+            controller={"scrollZoom": False},
+        )
+    )
+
+
+@st.fragment
+@timed_section
+def render_best_categories(state: PageState, city_choice: str, selected_city: Optional[CityRecord]) -> None:
+    lang = state.lang
+    st.subheader(t(lang, "best_categories"))
+    st.caption(t(lang, "best_hint"))
+    best_limit = st.slider(t(lang, "top_n"), 3, 8, 5, 1)
+    eval_count = st.slider(t(lang, "categories_to_eval"), 5, min(20, len(BUSINESS_OSM_MAP)), 8, 1)
+    best_candidates = list(BUSINESS_OSM_MAP.keys())[:eval_count]
+    with st.spinner(t(lang, "best_hint")):
+        best_counts = fetch_competitor_counts(
+            city_choice,
+            state.iso2,
+            tuple(best_candidates),
+            selected_city.lat if selected_city else None,
+            selected_city.lon if selected_city else None,
+            state.radius_m,
+        )
+    if best_counts is None:
+        st.warning(t(lang, "overpass_failed"))
+        return
+    best_rows = [
+        {"category": category, "competitors": best_counts.get(category, 0)} for category in best_candidates
+    ]
+    best_rows = sorted(best_rows, key=lambda x: x["competitors"])[:best_limit]
+    st.table(
+        {
+            t(lang, "table_category"): [row["category"] for row in best_rows],
+            t(lang, "table_competitors"): [row["competitors"] for row in best_rows],
+        }
+    )
+
+
+@st.fragment
+@timed_section
+def render_country_compare(state: PageState, countries: List[Tuple[str, str, str]]) -> None:
+    lang = state.lang
+    selected_name = state.country_name
+    st.subheader(t(lang, "compare_block"))
+    country_label = [name for _, _, name in countries]
+    compare_names = st.multiselect(t(lang, "country"), country_label, default=[selected_name])
+    compare_codes = {n: i3 for _, i3, n in countries if n in compare_names}
+    snapshots = fetch_country_snapshots(tuple(compare_codes[name] for name in compare_names))
+    compare_rows = []
+    for name in compare_names:
+        snapshot = dict(snapshots.get(compare_codes[name], {}))
+        snapshot["country"] = name
+        compare_rows.append(snapshot)
+    if compare_rows:
+        st.dataframe(compare_rows, use_container_width=True)
+
+    st.subheader(t(lang, "multi_rank_block"))
+    st.caption(t(lang, "multi_rank_note"))
+    rank_all = st.checkbox(t(lang, "multi_rank_all"), value=False)
+    rank_names = set(country_label) if rank_all else set(compare_names)
+    rank_codes = tuple((iso2, iso3) for iso2, iso3, name in countries if name in rank_names)
+    if not rank_codes:
+        return
+    with st.spinner(t(lang, "multi_rank_block")):
+        ranked = rank_across_countries(rank_codes, state.weights, MULTI_RANK_TOP_K)
+    if ranked.empty:
+        st.info(t(lang, "no_data"))
+        return
+    st.dataframe(
+        {
+            "City": ranked["name"].to_numpy(),
+            t(lang, "country"): ranked["country"].astype(str).to_numpy(),
+            "Score": [format_number(score) for score in ranked["score"]],
+            t(lang, "demand_index"): [format_number(value) for value in ranked["demand_index"]],
+        },
+        use_container_width=True,
+    )
+
+
+@st.fragment
+@timed_section
+def render_category_search(state: PageState, countries: List[Tuple[str, str, str]]) -> None:
+    lang = state.lang
+    st.subheader(t(lang, "best_city_block"))
+    st.caption(t(lang, "best_city_note"))
+    category = st.selectbox(t(lang, "business_category"), list(BUSINESS_OSM_MAP), key="best_city_category")
+    names = {name: (iso2, iso3) for iso2, iso3, name in countries}
+    chosen = st.multiselect(t(lang, "country"), list(names), default=[state.country_name], key="best_city_countries")
+    codes = [names[name] for name in chosen]
+    if not codes or not FEATURES_PATH:
+        return
+    store = open_feature_store(FEATURES_PATH)
+    table = get_feature_table()
+    iso3s = tuple(iso3 for _, iso3 in codes)
+    # Read before the counts so a build finishing in between is not offered again.
+    builds = get_poi_matrix_builds()
+    running, failed = builds.status(iso3s, category, state.radius_m)
+    ranked, missing = rank_category(table, store.poi_counts(iso3s, category, state.radius_m), iso3s, MULTI_RANK_TOP_K)
+    unindexed = [iso3 for iso3 in missing if not len(table.top_rows(iso3, 1))]
+    buildable = [code for code in codes if code[1] in missing and code[1] not in unindexed + running]
+    if buildable and st.button(t(lang, "best_city_build"), key="best_city_build"):
+        builds.start(store, table, buildable, category, state.radius_m)
+        # Rerun so the captions below describe the build that just started.
+        st.rerun()
+    if unindexed:
+        st.caption(t(lang, "best_city_unindexed").format(countries=", ".join(unindexed)))
+    if buildable:
+        st.caption(t(lang, "best_city_missing").format(countries=", ".join(iso3 for _, iso3 in buildable)))
+    if any(iso3 in missing for iso3 in failed):
+        st.warning(t(lang, "overpass_failed"))
+    if running:
+        render_poi_build_progress(lang, tuple(running), category, state.radius_m)
+    if ranked.empty:
+        st.info(t(lang, "no_data"))
+        return
+    st.dataframe(
+        {
+            "City": ranked["name"].to_numpy(),
+            t(lang, "country"): ranked["country"].astype(str).to_numpy(),
+            t(lang, "demand_index"): [format_number(value) for value in ranked["demand_index"]],
+            t(lang, "table_competitors"): ranked["competitors"].to_numpy(),
+            t(lang, "best_city_density"): [format_number(value) for value in ranked["density_km2"]],
+            t(lang, "best_city_score"): [format_number(value) for value in ranked["opportunity"]],
+        },
+        use_container_width=True,
+    )
+
+
+SERIES_CHARTS = {
+    "NY.GDP.MKTP.CD": "#4c78a8",
+    "FP.CPI.TOTL.ZG": "#ff7a59",
+    "SL.UEM.TOTL.ZS": "#1da1f2",
+}
+
+
+@timed_section
+def render_series(state: PageState, countries: List[Tuple[str, str, str]], series_future: Future) -> pd.DataFrame:
+    lang = state.lang
+    st.subheader(t(lang, "series_block"))
+    st.caption(t(lang, "series_hint"))
+    names = {iso3: name for _, iso3, name in countries}
+    others = [iso3 for iso3 in names if iso3 != state.iso3]
+    compare = st.multiselect(
+        t(lang, "series_compare"),
+        others,
+        format_func=lambda iso3: names[iso3],
+        max_selections=SERIES_COMPARE_MAX,
+    )
+    if compare:
+        series = fetch_indicator_frame((state.iso3, *compare), SERIES_INDICATORS, *series_years())
+    else:
+        series = series_future.result()
+    if series.empty:
+        return series
+    labelled = series.assign(country=series["country"].map(lambda code: names.get(code, code)))
+    for indicator, color in SERIES_CHARTS.items():
+        rows = labelled[labelled["indicator"] == indicator]
+        if rows.empty:
+            continue
+        chart = alt.Chart(rows, title=indicator).encode(
+            x="year:O", y=alt.Y("value:Q", title=None), tooltip=["country", "year", "value"]
+        )
+        if compare:
+            chart = chart.mark_line().encode(color=alt.Color("country:N", title=t(lang, "country")))
+        else:
+            chart = chart.mark_line(color=color)
+        st.altair_chart(chart, use_container_width=True)
+    return series
+
+
+@timed_section
+def render_exports(
+    state: PageState,
+    ranked: List[Tuple[str, float]],
+    city_choice: str,
+    city_cost: Optional[float],
+    potential_clients: Optional[float],
+    series: pd.DataFrame,
+) -> None:
+    lang = state.lang
+    st.subheader(t(lang, "exports_block"))
+    st.download_button(
+        t(lang, "download_country"),
+        data=build_country_csv(state),
+        file_name=f"country_{state.iso3}.csv",
+        mime="text/csv",
+        on_click="ignore",
+    )
+
+    st.download_button(
+        t(lang, "download_cities"),
+        data=build_cities_csv(ranked),
+        file_name=f"cities_{state.iso3}.csv",
+        mime="text/csv",
+        on_click="ignore",
+    )
+
+    st.download_button(
+        t(lang, "download_report"),
+        data=build_report_text(state, city_choice, city_cost, potential_clients),
+        file_name=f"report_{state.iso3}.txt",
+        mime="text/plain",
+        on_click="ignore",
+    )
+
+    st.download_button(
+        t(lang, "download_series"),
+        data=build_series_csv(series),
+        file_name=f"series_{state.iso3}.csv",
+        mime="text/csv",
+        on_click="ignore",
+    )
+
+
+@timed_section
+def render_watchlist(lang: str) -> None:
+    st.subheader(t(lang, "watchlist"))
+    if st.session_state.watchlist:
+        st.dataframe(st.session_state.watchlist, use_container_width=True)
+        watchlist_csv = build_csv(st.session_state.watchlist, ["country", "city", "added"])
+        st.download_button(
+            t(lang, "export_watchlist"),
+            data=watchlist_csv,
+            file_name="watchlist.csv",
+            mime="text/csv",
+            on_click="ignore",
+        )
+    else:
+        st.info(t(lang, "watchlist_empty"))
 
 
-def format_number(value: Optional[float]) -> str:
-    if value is None:
-        return "-"
-    if isinstance(value, (int, float)) and value > 1_000_000:
-        return f"{value:,.0f}"
-    if isinstance(value, (int, float)):
-        return f"{value:,.2f}"
-    return str(value)
+def render_debug_panel(lang: str, session_id: Optional[str]) -> None:
+    records = get_metrics().run_records(session_id) if session_id else []
+    with st.expander(t(lang, "debug_panel"), expanded=False):
+        if not records:
+            st.info(t(lang, "no_data"))
+            return
+        frame = pd.DataFrame(
+            {
+                "name": [record.name for record in records],
+                "kind": [record.kind for record in records],
+                "parent": [record.parent for record in records],
+                "cache": [record.cache for record in records],
+                "status": [record.status for record in records],
+                "latency_ms": [round(record.latency_ms, 1) for record in records],
+                "bytes": [record.bytes for record in records],
+                "retries": [record.retries for record in records],
+            }
+        )
+        sections = frame[frame["kind"] == "section"]
+        if not sections.empty:
+            st.bar_chart(sections.groupby("name")["latency_ms"].sum().sort_values(ascending=False))
+        st.dataframe(frame.sort_values("latency_ms", ascending=False), use_container_width=True)
 
 
-def risk_level_label(score: Optional[float], lang: str) -> str:
-    if score is None:
-        return "-"
-    if score >= 1:
-        return t(lang, "risk_low")
-    if score >= 0:
-        return t(lang, "risk_medium")
-    return t(lang, "risk_high")
+@st.fragment
+def render_assistant(lang: str) -> None:
+    st.caption(t(lang, "assistant_intro"))
+    if "assistant_messages" not in st.session_state:
+        st.session_state.assistant_messages = []
+    for msg in st.session_state.assistant_messages:
+        with st.chat_message(msg["role"]):
+            st.write(msg["content"])
+    user_question = st.text_input(t(lang, "assistant_placeholder"), key="assistant_input")
+    if st.button(t(lang, "assistant_send"), key="assistant_send") and user_question:
+        st.session_state.assistant_messages.append({"role": "user", "content": user_question})
+        answer = get_help_answer(lang, user_question)
+        st.session_state.assistant_messages.append({"role": "assistant", "content": answer})
+        st.session_state.assistant_input = ""
 
 
 def main() -> None:
     st.set_page_config(page_title="Investment Radar", layout="wide")
+    session_id = current_session_id()
+    if session_id:
+        get_metrics().begin_run(session_id)
 
     lang = st.sidebar.selectbox(t("en", "language"), ["es", "en"], index=0)
     if "watchlist" not in st.session_state:
@@ -1077,6 +4056,13 @@ def main() -> None:
     )
     st.title(t(lang, "app_title"))
     st.caption(t(lang, "app_subtitle"))
+    if WARMUP_ON_START and not SNAPSHOT_OFFLINE:
+        worker = get_warmup_worker()
+        with st.sidebar:
+            if worker.done:
+                render_warmup_status(lang, worker)
+            else:
+                render_warmup_progress(lang, worker)
 
     countries = fetch_countries()
     if not countries:
@@ -1088,106 +4074,32 @@ def main() -> None:
         (iso2, iso3, name) for iso2, iso3, name in countries if name == selected_name
     )
     with st.sidebar.expander(t(lang, "ranking_block"), expanded=False):
-        weight_population = st.slider(t(lang, "weight_population"), 0.0, 3.0, 1.2, 0.1)
-        weight_gdp_pc = st.slider(t(lang, "weight_gdp_pc"), 0.0, 3.0, 1.0, 0.1)
-        weight_inflation = st.slider(t(lang, "weight_inflation"), 0.0, 3.0, 1.0, 0.1)
-        weight_unemployment = st.slider(t(lang, "weight_unemployment"), 0.0, 3.0, 1.0, 0.1)
-        weight_growth = st.slider(t(lang, "weight_growth"), 0.0, 3.0, 0.8, 0.1)
-        weight_risk = st.slider(t(lang, "weight_risk"), 0.0, 3.0, 0.6, 0.1)
+        weight_population = st.slider(t(lang, "weight_population"), 0.0, 3.0, DEFAULT_WEIGHTS["population"], 0.1)
+        weight_gdp_pc = st.slider(t(lang, "weight_gdp_pc"), 0.0, 3.0, DEFAULT_WEIGHTS["gdp_pc"], 0.1)
+        weight_inflation = st.slider(t(lang, "weight_inflation"), 0.0, 3.0, DEFAULT_WEIGHTS["inflation"], 0.1)
+        weight_unemployment = st.slider(t(lang, "weight_unemployment"), 0.0, 3.0, DEFAULT_WEIGHTS["unemployment"], 0.1)
+        weight_growth = st.slider(t(lang, "weight_growth"), 0.0, 3.0, DEFAULT_WEIGHTS["growth"], 0.1)
+        weight_risk = st.slider(t(lang, "weight_risk"), 0.0, 3.0, DEFAULT_WEIGHTS["risk"], 0.1)
     with st.sidebar.expander(t(lang, "alerts_block"), expanded=False):
         alert_inflation = st.slider(t(lang, "alert_inflation"), 0.0, 50.0, 10.0, 0.5)
         alert_unemployment = st.slider(t(lang, "alert_unemployment"), 0.0, 50.0, 12.0, 0.5)
         alert_risk = st.slider(t(lang, "alert_risk"), -2.5, 2.5, -0.5, 0.1)
-    max_points = st.sidebar.slider(t(lang, "max_points"), 50, 300, 150, 50)
-    radius_km = st.sidebar.slider(t(lang, "radius_km"), 1, 30, 10, 1)
+    radius_km = st.sidebar.slider(t(lang, "radius_km"), 1, 30, DEFAULT_RADIUS_KM, 1)
     show_map = st.sidebar.checkbox(t(lang, "map_block"), value=False)
-    show_heatmap = st.sidebar.checkbox(t(lang, "heatmap"), value=False)
     show_best = st.sidebar.checkbox(t(lang, "best_categories"), value=False)
 
-    gdp, gdp_year = fetch_indicator(selected_iso3, "NY.GDP.MKTP.CD")
-    gdp_pc, gdp_pc_year = fetch_indicator(selected_iso3, "NY.GDP.PCAP.CD")
-    pop, pop_year = fetch_indicator(selected_iso3, "SP.POP.TOTL")
-    density, density_year = fetch_indicator(selected_iso3, "EN.POP.DNST")
-    inflation, inflation_year = fetch_indicator(selected_iso3, "FP.CPI.TOTL.ZG")
-    unemployment, unemployment_year = fetch_indicator(selected_iso3, "SL.UEM.TOTL.ZS")
-    growth, growth_year = fetch_indicator(selected_iso3, "NY.GDP.MKTP.KD.ZG")
-    tax_revenue, tax_year = fetch_indicator(selected_iso3, "GC.TAX.TOTL.GD.ZS")
-    current_account, ca_year = fetch_indicator(selected_iso3, "BN.CAB.XOKA.GD.ZS")
-    median_age, median_age_year = fetch_indicator(selected_iso3, "SP.POP.MEDN")
-    urbanization, urban_year = fetch_indicator(selected_iso3, "SP.URB.TOTL.IN.ZS")
-    labor_force, labor_year = fetch_indicator(selected_iso3, "SL.TLF.CACT.ZS")
-    risk_score, risk_year = fetch_wgi_risk(selected_iso3)
+    scheduler = get_fetch_scheduler()
+    indicators_future = scheduler.submit(fetch_country_indicators, (selected_iso3,))
+    city_loader = session_city_loader(selected_iso2)
+    series_future = scheduler.submit(fetch_indicator_frame, (selected_iso3,), SERIES_INDICATORS, *series_years())
 
-    st.subheader(t(lang, "country_metrics"))
-    col1, col2, col3, col4 = st.columns(4)
-    col1.metric(t(lang, "gdp"), format_number(gdp))
-    col2.metric(t(lang, "gdp_pc"), format_number(gdp_pc))
-    col3.metric(t(lang, "population"), format_number(pop))
-    col4.metric(t(lang, "density"), format_number(density))
-    st.caption(
-        f"{t(lang, 'updated')}: "
-        f"{gdp_year or '-'}, {gdp_pc_year or '-'}, {pop_year or '-'}, {density_year or '-'}"
-    )
-
-    st.subheader(t(lang, "econ_block"))
-    econ1, econ2, econ3, econ4 = st.columns(4)
-    econ1.metric(t(lang, "inflation"), format_number(inflation))
-    econ2.metric(t(lang, "unemployment"), format_number(unemployment))
-    econ3.metric(t(lang, "growth"), format_number(growth))
-    econ4.metric(t(lang, "tax_revenue"), format_number(tax_revenue))
-    econ5, econ6, econ7 = st.columns(3)
-    econ5.metric(t(lang, "current_account"), format_number(current_account))
-    econ6.metric(t(lang, "urbanization"), format_number(urbanization))
-    econ7.metric(t(lang, "labor_force"), format_number(labor_force))
-    st.caption(
-        f"{t(lang, 'updated')}: "
-        f"{inflation_year or '-'}, {unemployment_year or '-'}, {growth_year or '-'}, "
-        f"{tax_year or '-'}, {ca_year or '-'}, {urban_year or '-'}, {labor_year or '-'}"
-    )
-
-    st.subheader(t(lang, "risk_block"))
-    risk1, risk2, risk3 = st.columns(3)
-    risk1.metric(t(lang, "risk_score"), format_number(risk_score))
-    risk2.metric(t(lang, "risk_level"), risk_level_label(risk_score, lang))
-    risk3.metric(t(lang, "median_age"), format_number(median_age))
-    st.caption(f"{t(lang, 'updated')}: {risk_year or '-'}, {median_age_year or '-'}")
-
-    st.subheader(t(lang, "alerts_block"))
-    if inflation is not None and inflation > alert_inflation:
-        st.warning(f"{t(lang, 'inflation')}: {format_number(inflation)}")
-    if unemployment is not None and unemployment > alert_unemployment:
-        st.warning(f"{t(lang, 'unemployment')}: {format_number(unemployment)}")
-    if risk_score is not None and risk_score < alert_risk:
-        st.warning(f"{t(lang, 'risk_score')}: {format_number(risk_score)}")
-
-    st.subheader(t(lang, "summary_block"))
-    indicator_values = [
-        gdp,
-        gdp_pc,
-        pop,
-        density,
-        inflation,
-        unemployment,
-        growth,
-        tax_revenue,
-        current_account,
-        median_age,
-        urbanization,
-        labor_force,
-        risk_score,
-    ]
-    available = sum(1 for value in indicator_values if value is not None)
-    data_quality = available / len(indicator_values) * 100
-    summary1, summary2, summary3 = st.columns(3)
-    demand_index = compute_demand_index(None, density, gdp_pc)
-    composite_score = compute_city_score(
-        None,
-        gdp_pc,
-        inflation,
-        unemployment,
-        growth,
-        risk_score,
-        {
+    state = PageState(
+        lang=lang,
+        country_name=selected_name,
+        iso2=selected_iso2,
+        iso3=selected_iso3,
+        indicators=indicators_future.result().get(selected_iso3) or empty_country_indicators(),
+        weights={
             "population": weight_population,
             "gdp_pc": weight_gdp_pc,
             "inflation": weight_inflation,
@@ -1195,131 +4107,36 @@ def main() -> None:
             "growth": weight_growth,
             "risk": weight_risk,
         },
+        radius_m=radius_km * 1000,
+    )
+    render_country_metrics(
+        state, {"inflation": alert_inflation, "unemployment": alert_unemployment, "risk": alert_risk}
     )
-    summary1.metric(t(lang, "composite_score"), format_number(composite_score))
-    summary2.metric(t(lang, "demand_index"), format_number(demand_index))
-    summary3.metric(t(lang, "data_quality"), f"{data_quality:.0f}%")
 
-    cities = fetch_worldcities(selected_iso2)
-    if not cities:
+    # Read before the cities so a load finishing in between is not mistaken for complete.
+    complete = city_loader.done and city_loader.error is None
+    cities = city_loader.cities()
+    if city_loader.error is not None:
+        render_city_failure(lang, city_loader)
+    if not len(cities):
         st.warning(t(lang, "no_data"))
         return
-    years = [
-        gdp_year,
-        gdp_pc_year,
-        pop_year,
-        density_year,
-        inflation_year,
-        unemployment_year,
-        growth_year,
-        tax_year,
-        ca_year,
-        median_age_year,
-        urban_year,
-        labor_year,
-        risk_year,
-    ]
-    years = [int(y) for y in years if y]
-    latest_year = max(years) if years else None
-
-    st.markdown(f"<div class='section-title'>{t(lang, 'data_notes')}</div>", unsafe_allow_html=True)
-    snap1, snap2, snap3 = st.columns(3)
-    snap1.metric(t(lang, "latest_year_label"), latest_year or "-")
-    snap2.metric(t(lang, "cities_indexed_label"), format_number(len(cities)))
-    snap3.metric(t(lang, "top_city_pop_label"), format_number(max((c.population or 0) for c in cities)))
-    top_cities = sorted(
-        [c for c in cities if c.population],
-        key=lambda x: x.population or 0,
-        reverse=True,
-    )[:10]
-
-    st.subheader(t(lang, "top_cities"))
-    top_cols = st.columns(3)
-    for idx, city in enumerate(top_cities[:3]):
-        score = (city.population or 0) * (gdp_pc or 0) / 1_000_000 if gdp_pc else 0
-        top_cols[idx].markdown(
-            f"**{city.name}**  \n"
-            f"Pop: {format_number(city.population)}  \n"
-            f"Score: {format_number(score)}"
-        )
-
-    st.subheader(t(lang, "ranking_block"))
-    st.caption(t(lang, "ranking_note"))
-    weights = {
-        "population": weight_population,
-        "gdp_pc": weight_gdp_pc,
-        "inflation": weight_inflation,
-        "unemployment": weight_unemployment,
-        "growth": weight_growth,
-        "risk": weight_risk,
-    }
-    ranked = []
-    for city in top_cities:
-        ranked.append(
-            (
-                city.name,
-                compute_city_score(
-                    city.population,
-                    gdp_pc,
-                    inflation,
-                    unemployment,
-                    growth,
-                    risk_score,
-                    weights,
-                ),
-            )
-        )
-    ranked = sorted(ranked, key=lambda x: x[1], reverse=True)[:10]
-    st.table({"City": [c for c, _ in ranked], "Score": [format_number(s) for _, s in ranked]})
+    if not city_loader.done:
+        render_city_progress(lang, city_loader)
+    ranked, top_cities = render_ranking(state, cities, complete)
 
-    st.subheader(t(lang, "compare_cities"))
-    compare_city_names = st.multiselect(
-        t(lang, "compare_cities"),
-        [city.name for city in top_cities],
-        default=[city.name for city in top_cities[:3]],
-    )
-    if compare_city_names:
-        compare_rows = []
-        for city in top_cities:
-            if city.name not in compare_city_names:
-                continue
-            compare_rows.append(
-                {
-                    "city": city.name,
-                    "population": city.population or 0,
-                    "score": compute_city_score(
-                        city.population,
-                        gdp_pc,
-                        inflation,
-                        unemployment,
-                        growth,
-                        risk_score,
-                        weights,
-                    ),
-                }
-            )
-        df_compare = pd.DataFrame(compare_rows)
-        df_long = df_compare.melt(id_vars=["city"], value_vars=["population", "score"], var_name="metric", value_name="value")
-        chart = (
-            alt.Chart(df_long)
-            .mark_bar()
-            .encode(
-                x=alt.X("city:N", sort=None),
-                y=alt.Y("value:Q"),
-                color=alt.Color("metric:N"),
-                tooltip=["city", "metric", "value"],
-            )
+    city_by_name = {city.name: city for city in reversed(top_cities)}
+    city_query = st.text_input(t(lang, "city_search")).strip()
+    option_names = cities.search(city_query, CITY_OPTIONS).name if city_query else []
+    if not len(option_names):
+        option_names = np.concatenate(
+            [
+                [name for name, _ in ranked],
+                [city.name for city in top_cities],
+                cities.top_by_population(CITY_OPTIONS).name,
+            ]
         )
-        st.altair_chart(chart, use_container_width=True)
-
-    city_names = []
-    city_by_name = {}
-    seen = set()
-    for city in top_cities + cities:
-        if city.name and city.name not in seen:
-            seen.add(city.name)
-            city_names.append(city.name)
-            city_by_name[city.name] = city
+    city_names = [name for name in pd.unique(option_names) if name]
     city_choice = st.selectbox(t(lang, "city"), city_names)
     st.caption(t(lang, "investment_hint"))
 
@@ -1335,342 +4152,38 @@ def main() -> None:
             if not (item["country"] == selected_name and item["city"] == city_choice)
         ]
 
-    st.subheader(t(lang, "visual_block"))
-    st.caption(t(lang, "visual_note"))
-    flag_url = f"https://flagcdn.com/w160/{selected_iso2.lower()}.png"
-    skyline_query = city_choice.replace(" ", "%20")
-    skyline_url = f"https://source.unsplash.com/featured/900x600/?{skyline_query},skyline,finance"
-    visual1, visual2 = st.columns(2)
-    visual1.image(flag_url, caption=selected_name, use_container_width=True)
-    visual2.image(skyline_url, caption=city_choice, use_container_width=True)
-
-    selected_city = city_by_name.get(city_choice)
-    city_cost = fetch_city_cost_m2(city_choice, selected_name)
-    city_rent = fetch_city_rent(city_choice, selected_name)
-    potential_clients = None
-    if selected_city and selected_city.population:
-        if labor_force is not None:
-            participation = labor_force / 100
-            employment_rate = 1 - (unemployment or 0) / 100
-            potential_clients = selected_city.population * participation * employment_rate
-        else:
-            potential_clients = selected_city.population
-
-    city_demand = compute_demand_index(
-        selected_city.population if selected_city else None, density, gdp_pc
-    )
-    st.subheader(t(lang, "housing_block"))
-    house1, house2, house3, house4 = st.columns(4)
-    house1.metric(t(lang, "cost_m2"), format_number(city_cost))
-    house2.metric(t(lang, "rent_month"), format_number(city_rent))
-    house3.metric(t(lang, "potential_clients"), format_number(potential_clients))
-    house4.metric(t(lang, "demand_index"), format_number(city_demand))
-
-    st.subheader(t(lang, "business_category"))
-    search_term = st.text_input(t(lang, "search_business"))
-    categories = [c for c in BUSINESS_CATEGORIES if search_term.lower() in c.lower()] if search_term else BUSINESS_CATEGORIES
-    category_choice = st.selectbox(t(lang, "business_category"), categories)
-
-    zone_type_options = ["neighbourhood", "suburb", "quarter", "district"]
-    zone_types = st.multiselect(t(lang, "zone_types"), zone_type_options, default=zone_type_options)
-
-    zones = fetch_city_zones(
-        city_choice,
-        selected_iso2,
-        selected_city.lat if selected_city else None,
-        selected_city.lon if selected_city else None,
-    )
-    st.subheader(t(lang, "city_zones"))
-    if zones:
-        st.write(", ".join(zones[:50]))
-    else:
-        st.info(t(lang, "zones_empty"))
-
-    malls_offices = fetch_malls_offices(
-        city_choice,
-        selected_iso2,
-        selected_city.lat if selected_city else None,
-        selected_city.lon if selected_city else None,
-    )
-    st.subheader(t(lang, "malls_offices"))
-    if malls_offices:
-        st.write(", ".join(malls_offices[:50]))
-    else:
-        st.info(t(lang, "pois_empty"))
-
-    st.subheader(t(lang, "competition"))
-    competitors = fetch_competitors(
-        city_choice,
-        selected_iso2,
-        category_choice,
-        selected_city.lat if selected_city else None,
-        selected_city.lon if selected_city else None,
-        radius_km * 1000,
-    )
-    if competitors:
-        st.metric(t(lang, "competition_count"), competitors)
-    else:
-        st.info(t(lang, "category_empty"))
-
-    st.subheader(t(lang, "recommendations"))
-    st.caption(t(lang, "recommendation_note"))
-    rec_candidates = list(BUSINESS_OSM_MAP.keys())[:6]
-    rec_rows = []
-    for category in rec_candidates:
-        count = fetch_competitors(
+    selected_city = city_by_name.get(city_choice) or cities.find(city_choice)
+    city_lat = selected_city.lat if selected_city else None
+    city_lon = selected_city.lon if selected_city else None
+    city_cost_future = scheduler.submit(fetch_city_cost_m2, city_choice, selected_name)
+    prefetched = {
+        "zones": scheduler.submit(fetch_city_zones, city_choice, selected_iso2, city_lat, city_lon),
+        "malls": scheduler.submit(fetch_malls_offices, city_choice, selected_iso2, city_lat, city_lon),
+        "recommendations": scheduler.submit(
+            fetch_competitor_counts,
             city_choice,
             selected_iso2,
-            category,
-            selected_city.lat if selected_city else None,
-            selected_city.lon if selected_city else None,
-            radius_km * 1000,
-        )
-        score = city_demand / max(count + 1, 1)
-        rec_rows.append({"category": category, "score": score, "competitors": count})
-    rec_rows = sorted(rec_rows, key=lambda x: x["score"], reverse=True)[:3]
-    st.table(
-        {
-            t(lang, "table_category"): [row["category"] for row in rec_rows],
-            t(lang, "table_competitors"): [row["competitors"] for row in rec_rows],
-        }
-    )
-
-    if show_map:
-        st.subheader(t(lang, "map_block"))
-        if selected_city and selected_city.lat is not None and selected_city.lon is not None:
-            zone_points = fetch_zone_points(
-                city_choice,
-                selected_iso2,
-                selected_city.lat,
-                selected_city.lon,
-                zone_types,
-                max_points,
-                radius_km * 1000,
-            )
-            competitor_points = fetch_competitor_points(
-                city_choice,
-                selected_iso2,
-                category_choice,
-                selected_city.lat,
-                selected_city.lon,
-                max_points,
-                radius_km * 1000,
-            )
-            if zone_points or competitor_points:
-                layers = []
-                if zone_points:
-                    layers.append(
-                        pdk.Layer(
-                            "ScatterplotLayer",
-                            data=zone_points,
-                            get_position="[lon, lat]",
-                            get_radius=200,
-                            get_fill_color=[60, 120, 200, 160],
-                            pickable=True,
-                        )
-                    )
-                if competitor_points:
-                    layers.append(
-                        pdk.Layer(
-                            "ScatterplotLayer",
-                            data=competitor_points,
-                            get_position="[lon, lat]",
-                            get_radius=150,
-                            get_fill_color=[220, 60, 60, 160],
-                            pickable=True,
-                        )
-                    )
-                    if show_heatmap:
-                        layers.append(
-                            pdk.Layer(
-                                "HeatmapLayer",
-                                data=competitor_points,
-                                get_position="[lon, lat]",
-                                radius_pixels=60,
-                            )
-                        )
-                view = pdk.ViewState(
-                    latitude=selected_city.lat,
-                    longitude=selected_city.lon,
-                    zoom=11,
-                    pitch=0,
-                )
-                st.pydeck_chart(
-                    pdk.Deck(
-                        layers=layers,
-                        initial_view_state=view,
-                        tooltip={"text": "{name}"},
-                        controller={"scrollZoom": False},
-                    )
-                )
-            else:
-                st.info(t(lang, "map_empty"))
-        else:
-            st.info(t(lang, "map_empty"))
-
-    if show_best:
-        st.subheader(t(lang, "best_categories"))
-        st.caption(t(lang, "best_hint"))
-        best_limit = st.slider(t(lang, "top_n"), 3, 8, 5, 1)
-        eval_count = st.slider(t(lang, "categories_to_eval"), 5, min(20, len(BUSINESS_OSM_MAP)), 8, 1)
-        best_candidates = list(BUSINESS_OSM_MAP.keys())[:eval_count]
-        progress = st.progress(0)
-        best_rows = []
-        for idx, category in enumerate(best_candidates, start=1):
-            count = fetch_competitors(
-                city_choice,
-                selected_iso2,
-                category,
-                selected_city.lat if selected_city else None,
-                selected_city.lon if selected_city else None,
-                radius_km * 1000,
-            )
-            best_rows.append({"category": category, "competitors": count})
-            progress.progress(idx / len(best_candidates))
-        progress.empty()
-        best_rows = sorted(best_rows, key=lambda x: x["competitors"])[:best_limit]
-        st.table(
-            {
-                t(lang, "table_category"): [row["category"] for row in best_rows],
-                t(lang, "table_competitors"): [row["competitors"] for row in best_rows],
-            }
-        )
-
-    st.subheader(t(lang, "compare_block"))
-    compare_names = st.multiselect(t(lang, "country"), country_label, default=[selected_name])
-    compare_rows = []
-    for name in compare_names:
-        iso2, iso3, _ = next((i2, i3, n) for i2, i3, n in countries if n == name)
-        snapshot = fetch_country_snapshot(iso3)
-        snapshot["country"] = name
-        compare_rows.append(snapshot)
-    if compare_rows:
-        st.dataframe(compare_rows, use_container_width=True)
-
-    st.subheader(t(lang, "series_block"))
-    st.caption(t(lang, "series_hint"))
-    series_gdp = fetch_indicator_series(selected_iso3, "NY.GDP.MKTP.CD", 12)
-    series_inflation = fetch_indicator_series(selected_iso3, "FP.CPI.TOTL.ZG", 12)
-    series_unemployment = fetch_indicator_series(selected_iso3, "SL.UEM.TOTL.ZS", 12)
-    if series_gdp:
-        df_series = pd.DataFrame(
-            {
-                "year": [y for y, _ in series_gdp],
-                "gdp": [v for _, v in series_gdp],
-            }
-        )
-        chart = alt.Chart(df_series).mark_line().encode(x="year:O", y="gdp:Q", tooltip=["year", "gdp"])
-        st.altair_chart(chart, use_container_width=True)
-    if series_inflation:
-        df_inflation = pd.DataFrame(
-            {
-                "year": [y for y, _ in series_inflation],
-                "inflation": [v for _, v in series_inflation],
-            }
-        )
-        chart = alt.Chart(df_inflation).mark_line(color="#ff7a59").encode(
-            x="year:O", y="inflation:Q", tooltip=["year", "inflation"]
-        )
-        st.altair_chart(chart, use_container_width=True)
-    if series_unemployment:
-        df_unemployment = pd.DataFrame(
-            {
-                "year": [y for y, _ in series_unemployment],
-                "unemployment": [v for _, v in series_unemployment],
-            }
-        )
-        chart = alt.Chart(df_unemployment).mark_line(color="#1da1f2").encode(
-            x="year:O", y="unemployment:Q", tooltip=["year", "unemployment"]
-        )
-        st.altair_chart(chart, use_container_width=True)
-
-    st.subheader(t(lang, "exports_block"))
-    country_rows = [
-        {
-            "country": selected_name,
-            "gdp": gdp,
-            "gdp_pc": gdp_pc,
-            "population": pop,
-            "density": density,
-            "inflation": inflation,
-            "unemployment": unemployment,
-            "growth": growth,
-            "tax_revenue": tax_revenue,
-            "current_account": current_account,
-            "median_age": median_age,
-            "urbanization": urbanization,
-            "labor_force": labor_force,
-            "risk_score": risk_score,
-        }
-    ]
-    country_csv = build_csv(country_rows, list(country_rows[0].keys()))
-    st.download_button(
-        t(lang, "download_country"),
-        data=country_csv,
-        file_name=f"country_{selected_iso3}.csv",
-        mime="text/csv",
-    )
-
-    city_rows = []
-    for city_name, score in ranked:
-        city_rows.append({"city": city_name, "score": score})
-    cities_csv = build_csv(city_rows, ["city", "score"])
-    st.download_button(
-        t(lang, "download_cities"),
-        data=cities_csv,
-        file_name=f"cities_{selected_iso3}.csv",
-        mime="text/csv",
-    )
-
-    report_text = "\n".join(
-        [
-            f"Report generated: {datetime.utcnow().isoformat()}Z",
-            f"Country: {selected_name}",
-            f"GDP: {gdp}",
-            f"GDP per capita: {gdp_pc}",
-            f"Population: {pop}",
-            f"Inflation: {inflation}",
-            f"Unemployment: {unemployment}",
-            f"Growth: {growth}",
-            f"Risk score: {risk_score}",
-            f"City: {city_choice}",
-            f"Cost per m2: {city_cost}",
-            f"Potential clients: {potential_clients}",
-        ]
-    )
-    st.download_button(
-        t(lang, "download_report"),
-        data=report_text,
-        file_name=f"report_{selected_iso3}.txt",
-        mime="text/plain",
+            REC_CANDIDATES,
+            city_lat,
+            city_lon,
+            state.radius_m,
+        ),
+    }
+    city_cost = city_cost_future.result()
+    potential_clients = estimate_potential_clients(state, selected_city)
+    city_demand = compute_demand_index(
+        selected_city.population if selected_city else None, state.value("density"), state.value("gdp_pc")
     )
-
-    st.subheader(t(lang, "watchlist"))
-    if st.session_state.watchlist:
-        st.dataframe(st.session_state.watchlist, use_container_width=True)
-        watchlist_csv = build_csv(st.session_state.watchlist, ["country", "city", "added"])
-        st.download_button(
-            t(lang, "export_watchlist"),
-            data=watchlist_csv,
-            file_name="watchlist.csv",
-            mime="text/csv",
-        )
-    else:
-        st.info(t(lang, "watchlist_empty"))
+    render_city_detail(state, city_choice, city_cost, potential_clients, city_demand)
+    render_competition(state, city_choice, selected_city, city_demand, prefetched, show_map, show_best)
+    render_country_compare(state, countries)
+    render_category_search(state, countries)
+    series = render_series(state, countries, series_future)
+    render_exports(state, ranked, city_choice, city_cost, potential_clients, series)
+    render_watchlist(lang)
 
     with st.popover("⋮"):
-        st.caption(t(lang, "assistant_intro"))
-        if "assistant_messages" not in st.session_state:
-            st.session_state.assistant_messages = []
-        for msg in st.session_state.assistant_messages:
-            with st.chat_message(msg["role"]):
-                st.write(msg["content"])
-        user_question = st.text_input(t(lang, "assistant_placeholder"), key="assistant_input")
-        if st.button(t(lang, "assistant_send"), key="assistant_send") and user_question:
-            st.session_state.assistant_messages.append({"role": "user", "content": user_question})
-            answer = get_help_answer(lang, user_question)
-            st.session_state.assistant_messages.append({"role": "assistant", "content": answer})
-            st.session_state.assistant_input = ""
+        render_assistant(lang)
 
     st.subheader(t(lang, "data_notes"))
     st.write(t(lang, "sources"))
@@ -1678,6 +4191,13 @@ def main() -> None:
     st.write(t(lang, "rent_note"))
     st.write(t(lang, "clients_note"))
 
+    render_debug_panel(lang, session_id)
+    if METRICS_PATH:
+        try:
+            get_metrics().write(METRICS_PATH, "app")
+        except OSError:
+            pass
+
 
 if __name__ == "__main__":
     main()